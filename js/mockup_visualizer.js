@@ -2,10 +2,12 @@ const { createCanvas, loadImage } = require('canvas');
 const fs = require('fs');
 const path = require('path');
 
-// Paths
-const productImagePath = path.join(__dirname, '../python/generated_image.png');
-const templatePath = path.join(__dirname, 'template.png');
-const outputMockupPath = path.join(__dirname, 'mockup.png');
+// Paths (optional overrides: node mockup_visualizer.js [productImage] [outputMockup] [template])
+const [argProductImage, argOutputMockup, argTemplate] = process.argv.slice(2);
+const productImagePath = path.resolve(argProductImage || path.join(__dirname, '../python/generated_image.png'));
+const templatePath = path.resolve(argTemplate || path.join(__dirname, 'template.png'));
+const outputMockupPath = path.resolve(argOutputMockup || path.join(__dirname, 'mockup.png'));
+const outputJsonPath = path.join(path.dirname(outputMockupPath), 'mockup.json');
 
 async function createMockup() {
   // Load template and product image
@@ -41,11 +43,12 @@ async function createMockup() {
       product_image: productImagePath,
       template: templatePath
     };
-    fs.writeFileSync(path.join(__dirname, 'mockup.json'), JSON.stringify(mockupJson, null, 2));
+    fs.writeFileSync(outputJsonPath, JSON.stringify(mockupJson, null, 2));
     console.log('Mockup created:', mockupJson);
   });
 }
 
 createMockup().catch(err => {
   console.error('Error creating mockup:', err);
+  process.exitCode = 1;
 }); 
\ No newline at end of file
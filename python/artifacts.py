@@ -0,0 +1,79 @@
+"""
+Merch Maker Lite - Run Artifacts
+================================
+
+Each pipeline run gets its own directory (``runs/<run_id>/``) for its
+product.json, generated image, mockup and final payload, so several
+pipelines can run side by side on one host without overwriting each
+other's files.
+
+The final payload is also copied to its documented location under
+``samples/`` (atomically, so the last run to finish wins).
+"""
+
+import os
+import json
+import time
+import uuid
+import shutil
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_RUNS_DIR = Path(os.getenv('MERCH_RUNS_DIR', BASE_DIR / 'runs'))
+SAMPLES_DIR = BASE_DIR / 'samples'
+
+
+def new_run_id():
+    """Sortable, collision-free run id (timestamp + random suffix)"""
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+
+def _atomic_write(path, write):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+    return path
+
+
+class RunArtifacts:
+    """The artifact directory of one pipeline run"""
+
+    def __init__(self, run_id=None, runs_dir=DEFAULT_RUNS_DIR):
+        self.run_id = run_id or new_run_id()
+        self.dir = Path(runs_dir) / self.run_id
+        self.dir.mkdir(parents=True, exist_ok=True)
+
+    def __repr__(self):
+        return f"RunArtifacts({self.run_id!r})"
+
+    def path(self, name):
+        """Path of the artifact ``name`` in this run"""
+        return self.dir / name
+
+    def write_json(self, name, data):
+        def write(tmp_path):
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f, indent=2)
+        return _atomic_write(self.path(name), write)
+
+    def read_json(self, name):
+        with open(self.path(name), 'r') as f:
+            return json.load(f)
+
+    def import_file(self, source, name):
+        """Copy ``source`` into this run as ``name`` (no-op if it is already there)"""
+        destination = self.path(name)
+        if Path(source).resolve() != destination.resolve():
+            _atomic_write(destination, lambda tmp_path: shutil.copyfile(source, tmp_path))
+        return destination
+
+    def publish_sample(self, name, samples_dir=SAMPLES_DIR):
+        """Copy an artifact to ``samples/`` where the docs say to find it"""
+        source = self.path(name)
+        return _atomic_write(Path(samples_dir) / name, lambda tmp_path: shutil.copyfile(source, tmp_path))
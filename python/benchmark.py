@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Merch Maker Lite - Throughput Benchmark
+=======================================
+
+Drives the whole pipeline (product_generator, the mockup renderer and
+ShopifyIntegration) for N products at a time, fully offline. OpenAI and
+Shopify are replaced by the fake_servers.py stand-ins with injectable
+latency, answering in-process (an httpx transport for the OpenAI client,
+a requests adapter for the Shopify session); the store stand-in keeps a
+real call-limit bucket. With ``--over-http`` the clients talk to them
+over real HTTP instead.
+
+Each N runs in a fresh process, and for each it reports throughput,
+p50/p95/p99 latency per stage and per product, and that process's peak
+RSS. Results can be compared against a stored baseline to catch
+regressions.
+
+Usage:
+    python benchmark.py                                  # N = 1, 10, 100, 1000
+    python benchmark.py --sizes 10,100 --concurrency 16
+    python benchmark.py --sizes 100 --over-http
+    python benchmark.py --chat-latency 1.5 --image-latency 8 --shopify-latency 0.3
+    python benchmark.py --save-baseline bench_baseline.json
+    python benchmark.py --baseline bench_baseline.json   # exits 1 on a regression
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import httpx
+import openai
+
+import product_generator
+from artifacts import RunArtifacts
+from catalog_mirror import CatalogMirror
+from dedup import DedupIndex
+from fake_servers import FakeOpenAIServer, FakeShopifyServer, Latency
+from keywords import KeywordEngine
+from metrics import metrics
+from pipeline import Pipeline
+from shopify_integration import ShopifyIntegration
+from stage_cache import StageCache
+
+DEFAULT_SIZES = (1, 10, 100, 1000)
+BENCH_SHOP = 'benchmark.myshopify.com'
+STAGES = ('generate', 'mockup', 'create_product')
+# Relative slowdown (throughput or p95) that counts as a regression
+DEFAULT_TOLERANCE = 0.10
+# Module-level OpenAI client settings the benchmark overrides while it runs
+OPENAI_SETTINGS = ('api_key', 'base_url', 'http_client')
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far (None where unavailable)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+class Benchmark:
+    """Runs N products through the pipeline against the fake_servers.py stand-ins.
+
+    The stand-ins answer in-process (an httpx transport for the OpenAI
+    client, a requests adapter for the Shopify session), or over real HTTP
+    with ``over_http``. The OpenAI client settings and SHOPIFY_SHOP_URL are
+    overridden until close().
+    """
+
+    def __init__(self, concurrency=8, chat_latency=0.2, image_latency=0.5, shopify_latency=0.05,
+                 bucket_size=400, work_dir=None, keep_artifacts=False, over_http=False):
+        self.concurrency = concurrency
+        self.keep_artifacts = keep_artifacts
+        self.work_dir = work_dir or tempfile.mkdtemp(prefix='merch-bench-')
+        self.config = {
+            "concurrency": concurrency, "chat_latency": chat_latency, "image_latency": image_latency,
+            "shopify_latency": shopify_latency, "bucket_size": bucket_size, "over_http": over_http,
+        }
+        self._saved_openai = {name: getattr(openai, name) for name in OPENAI_SETTINGS}
+        self._saved_shop_url = os.environ.get('SHOPIFY_SHOP_URL')
+        self._saved_keywords = product_generator.keyword_engine
+
+        # No OpenAI rate limit: it isn't under test
+        self.openai_server = FakeOpenAIServer(chat_latency=Latency(chat_latency), image_latency=Latency(image_latency),
+                                              requests_per_minute=10 ** 9)
+        self.shopify_server = FakeShopifyServer(latency=Latency(shopify_latency), bucket_size=bucket_size)
+        if over_http:
+            self.openai_server.start()
+            self.shopify_server.start()
+        openai.api_key = 'benchmark-key'
+        openai.base_url = f"{self.openai_server.base_url}/"
+        openai.http_client = None if over_http else httpx.Client(transport=self.openai_server.httpx_transport())
+        # The store name keys the client's call-limit bucket
+        os.environ['SHOPIFY_SHOP_URL'] = BENCH_SHOP
+        shopify = ShopifyIntegration(base_url=self.shopify_server.api_url)
+        if not over_http:
+            adapter = self.shopify_server.requests_adapter()
+            shopify.session.mount('https://', adapter)
+            shopify.session.mount('http://', adapter)
+        shopify.staged_image_uploads = False
+        # Keep the benchmark's products out of the real keyword corpus
+        product_generator.keyword_engine = KeywordEngine(path=os.path.join(self.work_dir, 'keyword_corpus.sqlite3'))
+        self.pipeline = Pipeline(
+            shopify=shopify,
+            catalog=CatalogMirror(':memory:'),
+            dedup=DedupIndex(os.path.join(self.work_dir, 'dedup.sqlite3')),
+            stages=StageCache(enabled=False),
+        )
+
+    def _product(self, index):
+        """One product, end to end; every stage is timed into ``metrics``"""
+        run = RunArtifacts(f"product-{index:05d}", runs_dir=os.path.join(self.work_dir, 'runs'))
+        try:
+            with metrics.timer('merch_product_seconds'):
+                with metrics.timer('merch_stage_seconds', stage='generate'):
+                    generated = self.pipeline.generate(run=run, use_cache=False, variant=f"bench-{index}")
+                with metrics.timer('merch_stage_seconds', stage='mockup'):
+                    mockup = self.pipeline.mockup(generated, run=run)
+                with metrics.timer('merch_stage_seconds', stage='create_product'):
+                    upload = self.pipeline.upload(generated.product, mockup)
+                if upload is None:
+                    raise RuntimeError("product creation failed")
+            return True
+        except Exception as e:
+            print(f"❌ product {index} failed: {e}")
+            return False
+        finally:
+            if not self.keep_artifacts:
+                shutil.rmtree(run.dir, ignore_errors=True)
+
+    def run(self, count, verbose=False):
+        """Run ``count`` products; returns the result for this size"""
+        metrics.reset()  # each size runs in its own process, so nothing else is recording
+        sink = sys.stdout if verbose else io.StringIO()
+        started = time.perf_counter()
+        with redirect_stdout(sink), ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            outcomes = list(pool.map(self._product, range(count)))
+        elapsed = time.perf_counter() - started
+        failed = outcomes.count(False)
+        if failed and not verbose:
+            errors = [line for line in sink.getvalue().splitlines() if line.startswith('❌')]
+            print("\n".join(errors[:5]))
+        latencies = {stage: metrics.histogram('merch_stage_seconds', stage=stage) for stage in STAGES}
+        latencies['product'] = metrics.histogram('merch_product_seconds')
+        return {
+            "n": count,
+            "succeeded": count - failed,
+            "failed": failed,
+            "wall_seconds": round(elapsed, 3),
+            "throughput_per_min": round((count - failed) / elapsed * 60, 2) if elapsed else None,
+            "latency": {name: {q: stats[q] and round(stats[q], 4) for q in ('p50', 'p95', 'p99')}
+                        for name, stats in latencies.items() if stats},
+            "openai_calls": metrics.total('merch_openai_requests_total'),
+            "shopify_calls": metrics.total('merch_shopify_requests_total'),
+            "shopify_retries": metrics.total('merch_shopify_retries_total'),
+            "uploaded_mb": round(metrics.total('merch_shopify_upload_bytes_total') / (1024 * 1024), 2),
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+    def close(self):
+        """Stop the stand-ins and restore the settings overridden for the benchmark"""
+        self.openai_server.stop()
+        self.shopify_server.stop()
+        if openai.http_client is not self._saved_openai['http_client']:
+            openai.http_client.close()
+        for name, value in self._saved_openai.items():
+            setattr(openai, name, value)
+        if self._saved_shop_url is None:
+            os.environ.pop('SHOPIFY_SHOP_URL', None)
+        else:
+            os.environ['SHOPIFY_SHOP_URL'] = self._saved_shop_url
+        product_generator.keyword_engine = self._saved_keywords
+        self.pipeline.shopify.close()
+        if not self.keep_artifacts:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+
+
+def run_size(options, size, verbose=False, seed=None):
+    """Run ``size`` products on a new Benchmark (in a worker process); returns the result"""
+    if seed is not None:
+        random.seed(seed)
+    benchmark = Benchmark(**options)
+    print(f"⏱️ N={size}: work dir {benchmark.work_dir}")
+    try:
+        return benchmark.run(size, verbose)
+    finally:
+        benchmark.close()
+
+
+def format_result(result):
+    lines = [f"📊 N={result['n']}: {result['succeeded']} ok, {result['failed']} failed in "
+             f"{result['wall_seconds']:.2f}s → {result['throughput_per_min']} products/min, "
+             f"peak RSS {result['peak_rss_mb'] if result['peak_rss_mb'] is not None else 'n/a'} MB"]
+    for name, stats in result['latency'].items():
+        lines.append(f"   {name:<16} p50={stats['p50']:.3f}s p95={stats['p95']:.3f}s p99={stats['p99']:.3f}s")
+    lines.append(f"   OpenAI calls: {result['openai_calls']}, Shopify calls: {result['shopify_calls']} "
+                 f"({result['shopify_retries']} retries), uploaded {result['uploaded_mb']} MB")
+    return "\n".join(lines)
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Regressions against a baseline report: lower throughput or higher p95, beyond ``tolerance``"""
+    previous = {result['n']: result for result in baseline.get('results', [])}
+    regressions = []
+    for result in results:
+        base = previous.get(result['n'])
+        if base is None:
+            continue
+        if base.get('throughput_per_min') and result['throughput_per_min'] is not None:
+            if result['throughput_per_min'] < base['throughput_per_min'] * (1 - tolerance):
+                regressions.append(f"N={result['n']}: throughput {result['throughput_per_min']}/min "
+                                   f"vs baseline {base['throughput_per_min']}/min")
+        for name, stats in result['latency'].items():
+            base_p95 = base.get('latency', {}).get(name, {}).get('p95')
+            if base_p95 and stats['p95'] > base_p95 * (1 + tolerance):
+                regressions.append(f"N={result['n']}: {name} p95 {stats['p95']:.3f}s vs baseline {base_p95:.3f}s")
+        if base.get('failed') == 0 and result['failed']:
+            regressions.append(f"N={result['n']}: {result['failed']} products failed")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline end-to-end throughput benchmark")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma-separated product counts to run")
+    parser.add_argument("--concurrency", type=int, default=8, help="products in flight at once")
+    parser.add_argument("--chat-latency", type=float, default=0.2, help="median chat completion latency (s)")
+    parser.add_argument("--image-latency", type=float, default=0.5, help="median image generation latency (s)")
+    parser.add_argument("--shopify-latency", type=float, default=0.05, help="median Shopify call latency (s)")
+    parser.add_argument("--bucket-size", type=int, default=400,
+                        help="Shopify call-limit bucket (40 = standard plan, 400 = Plus)")
+    parser.add_argument("--over-http", action="store_true",
+                        help="go through real HTTP to the fake_servers.py stand-ins instead of in-process ones")
+    parser.add_argument("--seed", type=int, help="random seed for repeatable latencies")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="compare against this results JSON; exit 1 on a regression")
+    parser.add_argument("--save-baseline", help="write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="relative slowdown allowed before it counts as a regression")
+    parser.add_argument("--keep-artifacts", action="store_true", help="keep each product's run directory")
+    parser.add_argument("--verbose", action="store_true", help="show the pipeline's own output")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    options = {"concurrency": args.concurrency, "chat_latency": args.chat_latency,
+               "image_latency": args.image_latency, "shopify_latency": args.shopify_latency,
+               "bucket_size": args.bucket_size, "keep_artifacts": args.keep_artifacts, "over_http": args.over_http}
+    config = {key: value for key, value in options.items() if key != 'keep_artifacts'}
+    print(f"🏁 Benchmarking N={sizes} with {args.concurrency} products in flight")
+    results = []
+    # A fresh interpreter per size, so peak RSS (and warm caches) don't carry over between sizes
+    context = multiprocessing.get_context('spawn')
+    for size in sizes:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            result = pool.submit(run_size, options, size, args.verbose, args.seed).result()
+        results.append(result)
+        print(format_result(result))
+
+    report = {"config": config, "created_at": time.strftime('%Y-%m-%dT%H:%M:%S%z'), "results": results}
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"💾 Results saved to {path}")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        if baseline.get('config') != config:
+            print(f"⚠️ Baseline was recorded with different settings: {baseline.get('config')}")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("❌ Regressions against the baseline:")
+            for regression in regressions:
+                print(f"   {regression}")
+            return 1
+        print("✅ No regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
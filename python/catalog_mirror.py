@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Merch Maker Lite - Local Catalog Mirror
+=======================================
+
+Keeps a local SQLite copy of the store's products, indexed by id, handle,
+title and tags, so duplicate checks and lookups are index queries instead
+of repeated full API scans.
+
+Syncs are incremental: only products updated since the last sync are
+fetched (via updated_at_min). Deleted products only disappear on a full
+sync (``--full``).
+
+Usage:
+    python catalog_mirror.py            # incremental sync
+    python catalog_mirror.py --full     # full resync
+"""
+
+import os
+import json
+import sqlite3
+import argparse
+import threading
+from datetime import datetime
+
+DEFAULT_DB_PATH = os.getenv('SHOPIFY_CATALOG_DB', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '.cache', 'catalog.sqlite3'))
+
+# Only the attributes the mirror indexes are fetched during a sync (body_html seeds the dedup index)
+SYNC_FIELDS = ['id', 'handle', 'title', 'body_html', 'tags', 'status', 'product_type', 'vendor', 'updated_at']
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    handle TEXT,
+    title TEXT,
+    title_key TEXT,
+    status TEXT,
+    updated_at TEXT,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_products_handle ON products(handle);
+CREATE INDEX IF NOT EXISTS idx_products_title_key ON products(title_key);
+CREATE TABLE IF NOT EXISTS product_tags (
+    product_id INTEGER NOT NULL,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (product_id, tag)
+);
+CREATE INDEX IF NOT EXISTS idx_product_tags_tag ON product_tags(tag);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+'''
+
+
+def title_key(title):
+    """Normalise a title for duplicate lookups"""
+    return " ".join((title or "").casefold().split())
+
+
+def _split_tags(tags):
+    if isinstance(tags, str):
+        tags = tags.split(',')
+    return sorted({tag.strip().lower() for tag in tags or [] if tag.strip()})
+
+
+def _parse_time(value):
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return None
+
+
+class CatalogMirror:
+    """SQLite-backed mirror of the store's products"""
+
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        self.db_path = db_path
+        if db_path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            if db_path != ':memory:':
+                self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    # --- Writes ---
+    def _upsert(self, product):
+        self._conn.execute(
+            'INSERT OR REPLACE INTO products (id, handle, title, title_key, status, updated_at, data) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (product['id'], product.get('handle'), product.get('title'), title_key(product.get('title')),
+             product.get('status'), product.get('updated_at'), json.dumps(product)))
+        self._conn.execute('DELETE FROM product_tags WHERE product_id = ?', (product['id'],))
+        self._conn.executemany('INSERT INTO product_tags (product_id, tag) VALUES (?, ?)',
+                               [(product['id'], tag) for tag in _split_tags(product.get('tags'))])
+
+    def upsert(self, product):
+        """Record a product (e.g. one just created) without waiting for a sync"""
+        with self._lock, self._conn:
+            self._upsert(product)
+
+    def _get_state(self, key):
+        row = self._conn.execute('SELECT value FROM sync_state WHERE key = ?', (key,)).fetchone()
+        return row['value'] if row else None
+
+    def _set_state(self, key, value):
+        self._conn.execute('INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)', (key, value))
+
+    def sync(self, shopify, full=False, batch_size=500):
+        """Pull products updated since the last sync; returns how many were stored"""
+        with self._lock:
+            since = None if full else self._get_state('last_updated_at')
+        latest = since
+        latest_time = _parse_time(since)
+        seen = set() if full else None
+        count = 0
+        batch = []
+
+        def flush():
+            with self._lock, self._conn:
+                for product in batch:
+                    self._upsert(product)
+            batch.clear()
+
+        for product in shopify.iter_products(fields=SYNC_FIELDS, updated_at_min=since):
+            batch.append(product)
+            count += 1
+            if seen is not None:
+                seen.add(product['id'])
+            updated = _parse_time(product.get('updated_at'))
+            if updated and (latest_time is None or updated > latest_time):
+                latest, latest_time = product['updated_at'], updated
+            if len(batch) >= batch_size:
+                flush()
+        flush()
+
+        with self._lock, self._conn:
+            if seen is not None:
+                # Full sync: drop products that no longer exist in the store
+                self._conn.execute('CREATE TEMP TABLE IF NOT EXISTS seen_ids (id INTEGER PRIMARY KEY)')
+                self._conn.execute('DELETE FROM seen_ids')
+                self._conn.executemany('INSERT INTO seen_ids (id) VALUES (?)', [(i,) for i in seen])
+                self._conn.execute('DELETE FROM product_tags WHERE product_id NOT IN (SELECT id FROM seen_ids)')
+                self._conn.execute('DELETE FROM products WHERE id NOT IN (SELECT id FROM seen_ids)')
+            if latest:
+                self._set_state('last_updated_at', latest)
+            self._set_state('last_sync', datetime.now().astimezone().isoformat())
+        return count
+
+    # --- Lookups ---
+    def _rows(self, query, params=()):
+        with self._lock:
+            return [json.loads(row['data']) for row in self._conn.execute(query, params)]
+
+    def get(self, product_id):
+        rows = self._rows('SELECT data FROM products WHERE id = ?', (product_id,))
+        return rows[0] if rows else None
+
+    def find_by_handle(self, handle):
+        rows = self._rows('SELECT data FROM products WHERE handle = ?', (handle,))
+        return rows[0] if rows else None
+
+    def find_by_title(self, title):
+        """Products whose title matches ``title`` (case and whitespace insensitive)"""
+        return self._rows('SELECT data FROM products WHERE title_key = ?', (title_key(title),))
+
+    def find_by_tag(self, tag):
+        return self._rows(
+            'SELECT p.data FROM products p JOIN product_tags t ON t.product_id = p.id WHERE t.tag = ?',
+            (tag.strip().lower(),))
+
+    def find_existing(self, product_data):
+        """Return an existing store product matching this product's title, or None"""
+        matches = self.find_by_title(product_data.get('title'))
+        return matches[0] if matches else None
+
+    def iter_all(self, batch_size=1000):
+        """Yield every mirrored product, reading in batches"""
+        last_id = -1
+        while True:
+            rows = self._rows('SELECT data FROM products WHERE id > ? ORDER BY id LIMIT ?', (last_id, batch_size))
+            if not rows:
+                return
+            yield from rows
+            last_id = rows[-1]['id']
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM products').fetchone()[0]
+
+
+def main(argv=None):
+    from shopify_integration import ShopifyIntegration
+
+    parser = argparse.ArgumentParser(description="Sync the local Shopify catalog mirror")
+    parser.add_argument("--full", action="store_true", help="resync everything and drop deleted products")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="mirror database path")
+    args = parser.parse_args(argv)
+
+    mirror = CatalogMirror(args.db)
+    print("🔄 Syncing catalog mirror...")
+    updated = mirror.sync(ShopifyIntegration.shared(), full=args.full)
+    print(f"✅ {updated} products synced, {mirror.count()} in mirror ({args.db})")
+
+
+if __name__ == "__main__":
+    main()
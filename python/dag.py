@@ -0,0 +1,136 @@
+"""
+Merch Maker Lite - Stage Graph
+==============================
+
+A small dependency-graph executor: each stage starts on a worker thread
+as soon as the stages it depends on have finished, so independent work
+(catalog sync, template decoding, the duplicate check, ...) overlaps
+and a run takes as long as its longest dependency chain.
+
+After a run, ``critical_path()`` names the chain that determined the
+end-to-end time and ``report()`` formats the per-stage timings.
+"""
+
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from metrics import metrics
+
+
+class StageError(Exception):
+    """A stage failed (``stage`` is its name, the original error is chained)"""
+
+    def __init__(self, stage, error):
+        super().__init__(f"{stage}: {error}")
+        self.stage = stage
+        self.error = error
+
+
+class StageGraph:
+    """Stages keyed by name; each receives its dependencies' results as keyword arguments"""
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers
+        self.stages = {}
+        self.results = {}
+        self.timings = {}  # name -> (start, end) in seconds since the run started
+        self.skipped = []
+        self.elapsed = 0.0
+
+    def add(self, name, func, deps=()):
+        """Register ``func(**{dep: result})`` to run after ``deps``"""
+        if name in self.stages:
+            raise ValueError(f"Duplicate stage: {name}")
+        self.stages[name] = (func, tuple(deps))
+        return self
+
+    def _check(self):
+        for name, (_, deps) in self.stages.items():
+            missing = [dep for dep in deps if dep not in self.stages]
+            if missing:
+                raise ValueError(f"Stage {name} depends on unknown stages: {missing}")
+        # Kahn's algorithm, just to reject cycles up front
+        remaining = {name: set(deps) for name, (_, deps) in self.stages.items()}
+        while remaining:
+            ready = [name for name, deps in remaining.items() if not deps]
+            if not ready:
+                raise ValueError(f"Dependency cycle between stages: {sorted(remaining)}")
+            for name in ready:
+                del remaining[name]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+
+    def _run_stage(self, name, func, kwargs, origin):
+        start = time.perf_counter() - origin
+        try:
+            return func(**kwargs)
+        finally:
+            end = time.perf_counter() - origin
+            self.timings[name] = (start, end)
+            metrics.observe('merch_stage_seconds', end - start, stage=name)
+
+    def run(self):
+        """Run every stage; returns {name: result}.
+
+        If a stage fails, the stages that depend on it are skipped, the
+        others still finish, and StageError is raised for the first
+        failure.
+        """
+        self._check()
+        self.results, self.timings, self.skipped = {}, {}, []
+        failed = {}
+        pending = dict(self.stages)
+        running = {}
+        origin = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers or len(self.stages) or 1) as pool:
+            while pending or running:
+                for name, (func, deps) in list(pending.items()):
+                    if any(dep in failed or dep in self.skipped for dep in deps):
+                        del pending[name]
+                        self.skipped.append(name)
+                    elif all(dep in self.results for dep in deps):
+                        del pending[name]
+                        kwargs = {dep: self.results[dep] for dep in deps}
+                        # Stages run in a copy of the caller's context (e.g. its metrics scope)
+                        running[pool.submit(contextvars.copy_context().run, self._run_stage,
+                                            name, func, kwargs, origin)] = name
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        self.results[name] = future.result()
+                    except Exception as e:
+                        failed[name] = e
+        self.elapsed = time.perf_counter() - origin
+        if failed:
+            # Report the failure that happened first
+            name = min(failed, key=lambda stage: self.timings[stage][1])
+            raise StageError(name, failed[name]) from failed[name]
+        return self.results
+
+    def critical_path(self):
+        """The chain of stages, first to last, that ended last"""
+        if not self.timings:
+            return []
+        name = max(self.timings, key=lambda stage: self.timings[stage][1])
+        path = [name]
+        while True:
+            deps = [dep for dep in self.stages[name][1] if dep in self.timings]
+            if not deps:
+                return path[::-1]
+            name = max(deps, key=lambda dep: self.timings[dep][1])
+            path.append(name)
+
+    def report(self):
+        """Per-stage timings and the critical path, one line each"""
+        lines = []
+        for name, (start, end) in sorted(self.timings.items(), key=lambda item: item[1][0]):
+            lines.append(f"   {name:<16} {start:7.2f}s → {end:7.2f}s ({end - start:.2f}s)")
+        path = self.critical_path()
+        chain = " → ".join(f"{name} ({self.timings[name][1] - self.timings[name][0]:.2f}s)" for name in path)
+        lines.append(f"   Critical path: {chain}")
+        lines.append(f"   Wall time: {self.elapsed:.2f}s")
+        return "\n".join(lines)
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Merch Maker Lite - Near-Duplicate Idea Detection
+================================================
+
+MinHash/LSH similarity index over product ideas (title, description and
+tags). New ideas are checked against it right after text generation,
+before paying for an image, a mockup and an upload. Generated ideas and
+products seeded from the store are shingled from the same fields, so an
+idea already in the catalog is caught.
+
+Signatures are banded into an SQLite-backed LSH table, so a lookup only
+compares against the few candidates that share a band; this stays fast as
+the index grows to hundreds of thousands of ideas.
+
+Usage:
+    python dedup.py --from-catalog      # seed the index from the catalog mirror
+    python dedup.py --stats
+"""
+
+import os
+import re
+import html
+import struct
+import random
+import sqlite3
+import hashlib
+import argparse
+import threading
+
+DEFAULT_DB_PATH = os.getenv('MERCH_DEDUP_DB', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '.cache', 'dedup.sqlite3'))
+DEFAULT_THRESHOLD = float(os.getenv('MERCH_DEDUP_THRESHOLD', 0.7))
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_WORD = re.compile(r"[a-z0-9][a-z0-9'-]*")
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS items (
+    id TEXT PRIMARY KEY,
+    title TEXT,
+    signature BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS buckets (
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    item_id TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_buckets ON buckets(band, bucket);
+'''
+
+
+class DuplicateProductError(ValueError):
+    """Raised when every generated idea was a near-duplicate"""
+
+
+def _hash64(text):
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def idea_id(product):
+    """Stable id for a product idea (same title + description -> same id)"""
+    text = f"{product.get('title', '')}\n{product.get('description', '')}"
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def shingles(product):
+    """Word-bigram shingles of title + description, plus tag tokens.
+
+    Corpus-dependent TF-IDF keywords are left out, so an idea and the same
+    product read back from the store shingle alike.
+    """
+    words = _WORD.findall(f"{product.get('title', '')} {product.get('description', '')}".lower())
+    result = {f"{a} {b}" for a, b in zip(words, words[1:])}
+    result.update(words[:1])
+    tags = product.get('tags') or []
+    if isinstance(tags, str):
+        tags = tags.split(',')
+    result.update(f"t:{tag.strip().lower()}" for tag in tags if tag.strip())
+    return result
+
+
+def catalog_idea(product):
+    """A store product (as mirrored by catalog_mirror) in the shape of a generated idea"""
+    description = html.unescape(re.sub(r'<[^>]+>', ' ', product.get('body_html') or ''))
+    return {'title': product.get('title'), 'description': ' '.join(description.split()),
+            'tags': product.get('tags')}
+
+
+class MinHasher:
+    """MinHash signatures with ``num_perm`` universal hash permutations"""
+
+    def __init__(self, num_perm=64, seed=1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.permutations = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+                             for _ in range(num_perm)]
+
+    def signature(self, shingle_set):
+        hashes = [_hash64(s) for s in shingle_set] or [0]
+        return [min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+                for a, b in self.permutations]
+
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+
+class DedupIndex:
+    """SQLite-backed MinHash LSH index of product ideas"""
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, threshold=DEFAULT_THRESHOLD, num_perm=64, bands=16):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.db_path = db_path
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm)
+        self._format = f'<{num_perm}I'
+        if db_path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            if db_path != ':memory:':
+                self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def _band_keys(self, signature):
+        for band in range(self.bands):
+            chunk = signature[band * self.rows:(band + 1) * self.rows]
+            digest = hashlib.blake2b(struct.pack(f'<{self.rows}I', *chunk), digest_size=8).digest()
+            yield band, int.from_bytes(digest, 'little', signed=True)
+
+    def _query(self, signature, exclude_id=None):
+        candidates = set()
+        for band, bucket in self._band_keys(signature):
+            rows = self._conn.execute('SELECT item_id FROM buckets WHERE band = ? AND bucket = ?', (band, bucket))
+            candidates.update(row[0] for row in rows)
+        candidates.discard(exclude_id)
+        matches = []
+        for item_id in candidates:
+            row = self._conn.execute('SELECT title, signature FROM items WHERE id = ?', (item_id,)).fetchone()
+            if row:
+                score = similarity(signature, struct.unpack(self._format, row[1]))
+                if score >= self.threshold:
+                    matches.append({'id': item_id, 'title': row[0], 'similarity': score})
+        return sorted(matches, key=lambda match: match['similarity'], reverse=True)
+
+    def _add(self, item_id, title, signature):
+        if self._conn.execute('SELECT 1 FROM items WHERE id = ?', (item_id,)).fetchone():
+            return
+        self._conn.execute('INSERT INTO items (id, title, signature) VALUES (?, ?, ?)',
+                           (item_id, title, struct.pack(self._format, *signature)))
+        self._conn.executemany('INSERT INTO buckets (band, bucket, item_id) VALUES (?, ?, ?)',
+                               [(band, bucket, item_id) for band, bucket in self._band_keys(signature)])
+
+    def find_duplicates(self, product):
+        """Indexed ideas at least ``threshold`` similar to ``product``, best first"""
+        signature = self.hasher.signature(shingles(product))
+        with self._lock:
+            return self._query(signature, exclude_id=idea_id(product))
+
+    def add(self, product, item_id=None):
+        signature = self.hasher.signature(shingles(product))
+        with self._lock, self._conn:
+            self._add(item_id or idea_id(product), product.get('title'), signature)
+
+    def add_if_unique(self, product):
+        """Atomically check ``product`` and index it if it is new.
+
+        Returns the best existing match if it is a near-duplicate (and does
+        not index it), otherwise None. Re-adding the exact same idea (e.g. a
+        cached rerun) is not treated as a duplicate.
+        """
+        signature = self.hasher.signature(shingles(product))
+        item_id = idea_id(product)
+        with self._lock, self._conn:
+            matches = self._query(signature, exclude_id=item_id)
+            if matches:
+                return matches[0]
+            self._add(item_id, product.get('title'), signature)
+            return None
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM items').fetchone()[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the near-duplicate idea index")
+    parser.add_argument("--from-catalog", action="store_true", help="index every product in the catalog mirror")
+    parser.add_argument("--stats", action="store_true", help="show index size")
+    args = parser.parse_args(argv)
+
+    index = DedupIndex()
+    if args.from_catalog:
+        from catalog_mirror import CatalogMirror
+        mirror = CatalogMirror()
+        added = 0
+        for product in mirror.iter_all():
+            index.add(catalog_idea(product), item_id=f"shopify:{product['id']}")
+            added += 1
+        print(f"✅ Indexed {added} catalog products")
+    print(f"📊 Dedup index: {index.count()} ideas ({index.db_path})")
+
+
+if __name__ == "__main__":
+    main()
@@ -26,7 +26,7 @@ def test_shopify_connection():
     print("-" * 40)
     
     try:
-        shopify = ShopifyIntegration()
+        shopify = ShopifyIntegration.shared()
         products = shopify.get_products(limit=5)
         
         if products:
@@ -93,7 +93,7 @@ def upload_to_shopify(product_data, mockup_path=None):
     print("-" * 40)
     
     try:
-        shopify = ShopifyIntegration()
+        shopify = ShopifyIntegration.shared()
         shopify_product = shopify.create_product(product_data, mockup_path)
         
         if shopify_product:
@@ -132,7 +132,7 @@ def manage_product(product_id):
     
     if choice in ['y', 'yes']:
         try:
-            shopify = ShopifyIntegration()
+            shopify = ShopifyIntegration.shared()
             shopify.publish_product(product_id)
             print(f"SUCCESS: Product {product_id} published successfully!")
             print("SUCCESS: Product published and now live on Shopify!")
@@ -150,7 +150,7 @@ def show_results(product_id):
     print("   Summary of what was accomplished")
     print("-" * 40)
     
-    shopify = ShopifyIntegration()
+    shopify = ShopifyIntegration.shared()
     admin_url = f"https://{shopify.shop_url}/admin/products/{product_id}"
     store_url = f"https://{shopify.shop_url}"
     
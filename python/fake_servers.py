@@ -0,0 +1,642 @@
+#!/usr/bin/env python3
+"""
+Merch Maker Lite - Local Stand-in Servers
+=========================================
+
+HTTP stand-ins for the OpenAI and Shopify Admin APIs, so the pipeline can
+be load-tested offline. They implement the endpoints this project uses:
+
+- OpenAI: chat completions (create_product tool calls, streamed or not)
+  and image generations (b64_json or url), with x-ratelimit-* headers
+  and 429s once the requests-per-minute budget is spent.
+- Shopify: products (list with Link-header pagination, create, update),
+  product images, GraphQL (aliased productCreate batches, staged uploads,
+  bulk mutations and their status), plus the staged upload target and
+  bulk result downloads. REST calls go through a leaky call-limit bucket
+  reported in X-Shopify-Shop-Api-Call-Limit, with 429s when it is full;
+  GraphQL answers THROTTLED when its cost budget is exhausted.
+
+Both add log-normal latency and an optional rate of intermittent 5xx
+responses. Point the clients at them with OPENAI_BASE_URL and
+SHOPIFY_API_BASE_URL (credentials are not needed then). Without
+``start()`` they can also answer in-process, through an httpx transport
+(``httpx_transport()``, for the OpenAI client) or a requests adapter
+(``requests_adapter()``, for a requests session), with no sockets.
+
+Usage:
+    python fake_servers.py                                   # OpenAI on :8100, Shopify on :8200
+    python fake_servers.py --chat-latency 1.5 --image-latency 8 --error-rate 0.02 --bucket-size 40
+"""
+
+import io
+import re
+import json
+import time
+import uuid
+import base64
+import random
+import string
+import argparse
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+import httpx
+import requests
+from PIL import Image
+from requests.adapters import BaseAdapter
+
+from product_model import PRODUCT_FUNCTION_NAME
+
+SHOPIFY_API_VERSION = '2024-01'
+# GraphQL cost model: points per productCreate/mutation, bucket size and restore rate
+GRAPHQL_MUTATION_COST = 10
+GRAPHQL_MAX_COST = 1000
+GRAPHQL_RESTORE_RATE = 50.0
+
+
+class Latency:
+    """Log-normal latency around a median (seconds); a median of 0 means none"""
+
+    def __init__(self, median, sigma=0.4):
+        self.median = median
+        self.sigma = sigma
+
+    def sample(self):
+        if self.median <= 0:
+            return 0.0
+        return self.median * random.lognormvariate(0, self.sigma)
+
+    def wait(self):
+        time.sleep(self.sample())
+
+
+class LeakyBucket:
+    """``capacity`` units that drain at ``leak_rate`` per second"""
+
+    def __init__(self, capacity, leak_rate):
+        self.capacity = capacity
+        self.leak_rate = leak_rate
+        self.level = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _leak(self):
+        now = time.monotonic()
+        self.level = max(0.0, self.level - (now - self._updated) * self.leak_rate)
+        self._updated = now
+
+    def take(self, cost=1):
+        """Add ``cost`` if it fits; returns (accepted, level after)"""
+        with self._lock:
+            self._leak()
+            if self.level + cost > self.capacity:
+                return False, self.level
+            self.level += cost
+            return True, self.level
+
+    def wait_time(self, cost=1):
+        """Seconds until ``cost`` would fit"""
+        with self._lock:
+            self._leak()
+            return max(0.0, (self.level + cost - self.capacity) / self.leak_rate)
+
+
+def random_words(count):
+    return " ".join("".join(random.choices(string.ascii_lowercase, k=random.randint(4, 9))) for _ in range(count))
+
+
+def product_idea():
+    """create_product arguments for a new, unique product idea"""
+    return {
+        "title": f"{random_words(2).title()} Tee",
+        "description": random_words(16),
+        "tags": random_words(6).split(),
+    }
+
+
+def design_png(size=1024):
+    """PNG bytes standing in for a generated design"""
+    image = Image.merge('RGB', [
+        Image.linear_gradient('L').resize((size, size)),
+        Image.linear_gradient('L').rotate(90).resize((size, size)),
+        Image.new('L', (size, size), 128),
+    ])
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Routes requests to ``server.app.handle`` and writes its (status, headers, body) answer"""
+    protocol_version = 'HTTP/1.1'
+
+    def _read_body(self):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            body = b''
+            while True:
+                size = int(self.rfile.readline().strip() or b'0', 16)
+                if not size:
+                    self.rfile.readline()
+                    return body
+                body += self.rfile.read(size)
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+    def _dispatch(self):
+        body = self._read_body()
+        status, headers, payload = self.server.app.handle(self.command, self.path, self.headers, body)
+        if callable(payload):
+            # Streamed (server-sent events): no length, close when done
+            self.send_response(status)
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            self.close_connection = True
+            for chunk in payload():
+                self.wfile.write(chunk)
+                self.wfile.flush()
+            return
+        if not isinstance(payload, bytes):
+            payload = json.dumps(payload).encode('utf-8')
+            headers.setdefault('Content-Type', 'application/json')
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _dispatch
+
+    def log_message(self, *args):
+        pass
+
+
+def _encode(headers, payload):
+    """(headers, body) of a ``handle`` answer for an in-process response"""
+    if callable(payload):
+        return headers, b''.join(payload())
+    if not isinstance(payload, bytes):
+        return {'Content-Type': 'application/json', **headers}, json.dumps(payload).encode('utf-8')
+    return headers, payload
+
+
+class StandInAdapter(BaseAdapter):
+    """requests adapter answering from a stand-in's ``handle`` in-process"""
+
+    def __init__(self, app):
+        super().__init__()
+        self.app = app
+
+    @staticmethod
+    def _body(request):
+        body = request.body
+        if body is None:
+            return b''
+        if isinstance(body, str):
+            return body.encode('utf-8')
+        if isinstance(body, bytes):
+            return body
+        return b''.join(body)  # streamed upload body
+
+    def send(self, request, **kwargs):
+        status, headers, payload = self.app.handle(request.method, request.path_url, request.headers,
+                                                   self._body(request))
+        headers, content = _encode(headers, payload)
+        response = requests.Response()
+        response.request = request
+        response.url = request.url
+        response.status_code = status
+        response.headers.update(headers)
+        response._content = content
+        return response
+
+    def close(self):
+        pass
+
+
+class StandInServer:
+    """Base for the stand-ins: serves ``handle`` on a background thread once started"""
+
+    def __init__(self, host='127.0.0.1', port=0, error_rate=0.0):
+        self.error_rate = error_rate
+        self.requests = 0
+        self._lock = threading.Lock()
+        self.host, self.port = host, port
+        self.httpd = None
+
+    @property
+    def url(self):
+        """Base URL (only routed through the transport/adapter until started)"""
+        return f"http://{self.host}:{self.port}"
+
+    def start(self):
+        self.httpd = ThreadingHTTPServer((self.host, self.port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.app = self
+        self.host, self.port = self.httpd.server_address[:2]
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+    def _httpx_handle(self, request):
+        status, headers, payload = self.handle(request.method, request.url.raw_path.decode('ascii'),
+                                               request.headers, request.read())
+        if callable(payload):
+            return httpx.Response(status, headers=headers, content=payload())
+        headers, content = _encode(headers, payload)
+        return httpx.Response(status, headers=headers, content=content)
+
+    def httpx_transport(self):
+        """httpx transport answering in-process (for ``httpx.Client(transport=...)``)"""
+        return httpx.MockTransport(self._httpx_handle)
+
+    def requests_adapter(self):
+        """requests adapter answering in-process (for ``session.mount(...)``)"""
+        return StandInAdapter(self)
+
+    def _count(self):
+        with self._lock:
+            self.requests += 1
+
+    def _server_error(self):
+        """An intermittent 5xx, or None"""
+        if self.error_rate and random.random() < self.error_rate:
+            return random.choice((500, 502, 503))
+        return None
+
+    def handle(self, method, path, headers, body):
+        raise NotImplementedError
+
+
+class FakeOpenAIServer(StandInServer):
+    """Stand-in for /v1/chat/completions and /v1/images/generations"""
+
+    def __init__(self, host='127.0.0.1', port=0, chat_latency=Latency(0.5), image_latency=Latency(2.0),
+                 requests_per_minute=500, error_rate=0.0):
+        super().__init__(host, port, error_rate)
+        self.chat_latency = chat_latency
+        self.image_latency = image_latency
+        self.rpm = LeakyBucket(requests_per_minute, requests_per_minute / 60.0)
+        self.image = design_png()
+        self.image_b64 = base64.b64encode(self.image).decode('ascii')
+
+    @property
+    def base_url(self):
+        """Value for OPENAI_BASE_URL"""
+        return f"{self.url}/v1"
+
+    def _rate_headers(self, level):
+        capacity = self.rpm.capacity
+        return {
+            'x-ratelimit-limit-requests': str(int(capacity)),
+            'x-ratelimit-remaining-requests': str(max(0, int(capacity - level))),
+            'x-ratelimit-reset-requests': f"{60.0 / capacity:.3f}s",
+        }
+
+    def _error(self, status, message, headers=None, code=None):
+        return status, headers or {}, {"error": {"message": message, "type": "stand_in", "code": code}}
+
+    def handle(self, method, path, headers, body):
+        self._count()
+        route = urlparse(path).path
+        if method == 'GET' and route.startswith('/v1/files/'):
+            return 200, {'Content-Type': 'image/png'}, self.image
+        if method != 'POST' or route not in ('/v1/chat/completions', '/v1/images/generations'):
+            return self._error(404, f"No stand-in for {method} {route}")
+        accepted, level = self.rpm.take()
+        rate_headers = self._rate_headers(level)
+        if not accepted:
+            retry_ms = int(self.rpm.wait_time() * 1000) + 1
+            return self._error(429, "Rate limit reached for requests",
+                               {**rate_headers, 'retry-after-ms': str(retry_ms)}, 'rate_limit_exceeded')
+        request = json.loads(body or b'{}')
+        if route == '/v1/images/generations':
+            self.image_latency.wait()
+        else:
+            self.chat_latency.wait()
+        status = self._server_error()
+        if status:
+            return self._error(status, "The server had an error while processing your request", rate_headers)
+        if route == '/v1/images/generations':
+            return 200, rate_headers, self._image(request)
+        if request.get('stream'):
+            return 200, {**rate_headers, 'Content-Type': 'text/event-stream'}, self._chat_stream(request)
+        return 200, rate_headers, self._chat(request)
+
+    def _usage(self, request):
+        prompt = sum(len(str(message.get('content') or '')) for message in request.get('messages', [])) // 4
+        return {"prompt_tokens": prompt, "completion_tokens": 90, "total_tokens": prompt + 90}
+
+    def _chat(self, request):
+        arguments = json.dumps(product_idea())
+        if request.get('tools'):
+            message = {"role": "assistant", "content": None, "tool_calls": [{
+                "id": f"call_{uuid.uuid4().hex[:12]}", "type": "function",
+                "function": {"name": PRODUCT_FUNCTION_NAME, "arguments": arguments}}]}
+            finish_reason = "tool_calls"
+        else:
+            message, finish_reason = {"role": "assistant", "content": arguments}, "stop"
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "object": "chat.completion", "created": int(time.time()),
+            "model": request.get('model', 'stand-in'),
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+            "usage": self._usage(request),
+        }
+
+    def _chat_stream(self, request):
+        """Server-sent events: the arguments in small fragments, then usage if asked for"""
+        arguments = json.dumps(product_idea())
+        base = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "object": "chat.completion.chunk",
+                "created": int(time.time()), "model": request.get('model', 'stand-in')}
+        fragment_delay = self.chat_latency.sample() / max(len(arguments) // 8, 1)
+
+        def event(data):
+            return f"data: {json.dumps(data)}\n\n".encode('utf-8')
+
+        def events():
+            yield event({**base, "choices": [{"index": 0, "finish_reason": None, "delta": {
+                "role": "assistant", "tool_calls": [{"index": 0, "id": f"call_{uuid.uuid4().hex[:12]}",
+                                                     "type": "function",
+                                                     "function": {"name": PRODUCT_FUNCTION_NAME, "arguments": ""}}]}}]})
+            for start in range(0, len(arguments), 8):
+                time.sleep(fragment_delay)
+                yield event({**base, "choices": [{"index": 0, "finish_reason": None, "delta": {
+                    "tool_calls": [{"index": 0, "function": {"arguments": arguments[start:start + 8]}}]}}]})
+            yield event({**base, "choices": [{"index": 0, "finish_reason": "tool_calls", "delta": {}}]})
+            if (request.get('stream_options') or {}).get('include_usage'):
+                yield event({**base, "choices": [], "usage": self._usage(request)})
+            yield b"data: [DONE]\n\n"
+        return events
+
+    def _image(self, request):
+        if request.get('response_format') == 'url':
+            item = {"url": f"{self.url}/v1/files/{uuid.uuid4().hex}.png"}
+        else:
+            item = {"b64_json": self.image_b64}
+        return {"created": int(time.time()), "data": [{**item, "revised_prompt": request.get('prompt')}]}
+
+
+def _multipart_file(body, content_type):
+    """The bytes of the file part of a multipart/form-data body"""
+    boundary = re.search(r'boundary=([^;]+)', content_type or '')
+    if not boundary:
+        return body
+    for part in body.split(b'--' + boundary.group(1).strip('"').encode('ascii')):
+        head, _, content = part.partition(b'\r\n\r\n')
+        if b'filename=' in head:
+            return content[:-2] if content.endswith(b'\r\n') else content
+    return b''
+
+
+class FakeShopifyServer(StandInServer):
+    """Stand-in for the Admin API endpoints this project uses (an in-memory store)"""
+
+    def __init__(self, host='127.0.0.1', port=0, latency=Latency(0.1), bucket_size=40, error_rate=0.0,
+                 bulk_delay=1.0):
+        super().__init__(host, port, error_rate)
+        self.latency = latency
+        # Standard stores leak 2/s on a 40 bucket, Plus 20/s on 400
+        self.bucket = LeakyBucket(bucket_size, bucket_size / 20.0)
+        self.graphql_cost = LeakyBucket(GRAPHQL_MAX_COST, GRAPHQL_RESTORE_RATE)
+        self.bulk_delay = bulk_delay
+        self.products = {}
+        self.staged_files = {}
+        self.bulk_operations = {}
+        self._next_id = 1000
+        self._store_lock = threading.Lock()
+
+    @property
+    def api_url(self):
+        """Value for SHOPIFY_API_BASE_URL"""
+        return f"{self.url}/admin/api/{SHOPIFY_API_VERSION}"
+
+    def _new_id(self):
+        with self._store_lock:
+            self._next_id += 1
+            return self._next_id
+
+    def handle(self, method, path, headers, body):
+        self._count()
+        parsed = urlparse(path)
+        route, query = parsed.path, {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+        if route.startswith('/staged/') and method == 'POST':
+            self.staged_files[route[len('/staged/'):]] = _multipart_file(body, headers.get('Content-Type'))
+            return 201, {}, b''
+        if route.startswith('/bulk/') and method == 'GET':
+            operation = self.bulk_operations.get(route[len('/bulk/'):].split('.')[0])
+            if operation is None:
+                return 404, {}, {"errors": "Not Found"}
+            return 200, {'Content-Type': 'application/jsonl'}, operation['results']
+        prefix = f"/admin/api/{SHOPIFY_API_VERSION}"
+        if not route.startswith(prefix):
+            return 404, {}, {"errors": "Not Found"}
+        route = route[len(prefix):]
+
+        if route == '/graphql.json':
+            self.latency.wait()
+            status = self._server_error()
+            if status:
+                return status, {}, {"errors": "Internal Server Error"}
+            return self._graphql(json.loads(body or b'{}'))
+
+        accepted, level = self.bucket.take()
+        if not accepted:
+            return 429, {'X-Shopify-Shop-Api-Call-Limit': f"{self.bucket.capacity}/{self.bucket.capacity}",
+                         'Retry-After': '2.0'}, {"errors": "Exceeded 2 calls per second for api client. Reduce request rates to resume uninterrupted service."}
+        self.latency.wait()
+        call_limit = {'X-Shopify-Shop-Api-Call-Limit': f"{int(level)}/{self.bucket.capacity}"}
+        status = self._server_error()
+        if status:
+            return status, call_limit, {"errors": "Internal Server Error"}
+        status, extra, payload = self._rest(method, route, query, body)
+        return status, {**call_limit, **extra}, payload
+
+    # --- REST ---
+    def _rest(self, method, route, query, body):
+        match = re.fullmatch(r'/products(?:/(\d+))?(/images)?\.json', route)
+        if route == '/images.json' and method == 'POST':
+            return 200, {}, {"image": {"id": self._new_id(), "created_at": _now()}}
+        if not match:
+            return 404, {}, {"errors": "Not Found"}
+        product_id, images = int(match.group(1)) if match.group(1) else None, match.group(2)
+        if images:
+            if product_id not in self.products:
+                return 404, {}, {"errors": "Not Found"}
+            image = {"id": self._new_id(), "product_id": product_id, "created_at": _now()}
+            self.products[product_id].setdefault('images', []).append(image)
+            return 200, {}, {"image": image}
+        if product_id is None and method == 'GET':
+            return self._list_products(query)
+        if product_id is None and method == 'POST':
+            product = self._create_product(json.loads(body)['product'])
+            return 201, {}, {"product": product}
+        if product_id not in self.products:
+            return 404, {}, {"errors": "Not Found"}
+        if method == 'PUT':
+            with self._store_lock:
+                self.products[product_id].update(json.loads(body)['product'], updated_at=_now())
+        return 200, {}, {"product": self.products[product_id]}
+
+    def _create_product(self, data):
+        images = data.pop('images', None) or []
+        tags = data.get('tags', [])
+        now = _now()
+        product = {
+            **data,
+            "id": self._new_id(),
+            "handle": re.sub(r'[^a-z0-9]+', '-', str(data.get('title', '')).lower()).strip('-'),
+            "tags": ", ".join(tags) if isinstance(tags, list) else tags,
+            "status": str(data.get('status', 'draft')).lower(),
+            "created_at": now,
+            "updated_at": now,
+        }
+        product["images"] = [{"id": self._new_id(), "product_id": product["id"]} for _ in images]
+        with self._store_lock:
+            self.products[product["id"]] = product
+        return product
+
+    def _list_products(self, query):
+        limit = min(int(query.get('limit', 50)), 250)
+        if 'page_info' in query:
+            filters = json.loads(base64.urlsafe_b64decode(query['page_info']))
+        else:
+            filters = {'since_id': 0, 'updated_at_min': query.get('updated_at_min'), 'status': query.get('status')}
+        with self._store_lock:
+            matches = [product for product_id, product in sorted(self.products.items())
+                       if product_id > filters['since_id']
+                       and (not filters['updated_at_min'] or product['updated_at'] >= filters['updated_at_min'])
+                       and (not filters['status'] or product['status'] == filters['status'])]
+        page = matches[:limit]
+        if query.get('fields'):
+            fields = query['fields'].split(',')
+            page = [{key: product.get(key) for key in fields} for product in page]
+        headers = {}
+        if len(matches) > limit:
+            page_info = base64.urlsafe_b64encode(
+                json.dumps({**filters, 'since_id': matches[limit - 1]['id']}).encode('utf-8')).decode('ascii')
+            next_url = f"{self.api_url}/products.json?{urlencode({'limit': limit, 'page_info': page_info})}"
+            headers['Link'] = f'<{next_url}>; rel="next"'
+        return 200, headers, {"products": page}
+
+    # --- GraphQL ---
+    def _graphql(self, request):
+        query, variables = request.get('query', ''), request.get('variables') or {}
+        aliases = re.findall(r'(\w+)\s*:\s*productCreate\(input:\s*\$(\w+)', query)
+        cost = GRAPHQL_MUTATION_COST * max(len(aliases), 1) if 'mutation' in query else 1
+        accepted, level = self.graphql_cost.take(cost)
+        status = {"maximumAvailable": GRAPHQL_MAX_COST, "currentlyAvailable": int(GRAPHQL_MAX_COST - level),
+                  "restoreRate": GRAPHQL_RESTORE_RATE}
+        extensions = {"cost": {"requestedQueryCost": cost, "throttleStatus": status}}
+        if not accepted:
+            return 200, {}, {"errors": [{"message": "Throttled", "extensions": {"code": "THROTTLED"}}],
+                             "extensions": extensions}
+        if 'stagedUploadsCreate' in query:
+            data = self._staged_uploads(variables['input'])
+        elif 'bulkOperationRunMutation' in query:
+            data = self._run_bulk(variables['stagedUploadPath'])
+        elif 'BulkOperation' in query:
+            data = {"node": self._bulk_status(variables['id'])}
+        elif aliases:
+            data = {alias: self._product_create(variables.get(name) or {}) for alias, name in aliases}
+        elif 'productCreate' in query:
+            data = {"productCreate": self._product_create(variables.get('input') or {})}
+        else:
+            return 200, {}, {"errors": [{"message": "Unsupported query for the stand-in"}], "extensions": extensions}
+        return 200, {}, {"data": data, "extensions": extensions}
+
+    def _product_create(self, product_input):
+        if not product_input.get('title'):
+            return {"product": None, "userErrors": [{"field": ["title"], "message": "Title can't be blank"}]}
+        product = self._create_product({
+            "title": product_input['title'], "body_html": product_input.get('descriptionHtml'),
+            "vendor": product_input.get('vendor'), "product_type": product_input.get('productType'),
+            "tags": product_input.get('tags', []), "status": product_input.get('status', 'DRAFT'),
+        })
+        return {"product": {"id": f"gid://shopify/Product/{product['id']}", "handle": product['handle'],
+                            "title": product['title'], "status": product['status'].upper()},
+                "userErrors": []}
+
+    def _staged_uploads(self, inputs):
+        targets = []
+        for item in inputs:
+            key = f"tmp/{uuid.uuid4().hex}/{item.get('filename', 'upload')}"
+            targets.append({"url": f"{self.url}/staged/{key}", "resourceUrl": f"{self.url}/staged/{key}",
+                            "parameters": [{"name": "key", "value": key},
+                                           {"name": "Content-Type", "value": item.get('mimeType', '')}]})
+        return {"stagedUploadsCreate": {"stagedTargets": targets, "userErrors": []}}
+
+    def _run_bulk(self, staged_upload_path):
+        lines = self.staged_files.get(staged_upload_path)
+        if lines is None:
+            return {"bulkOperationRunMutation": {"bulkOperation": None, "userErrors": [
+                {"field": ["stagedUploadPath"], "message": "Staged upload not found"}]}}
+        operation_id = uuid.uuid4().hex
+        operation = {"id": f"gid://shopify/BulkOperation/{operation_id}", "status": "RUNNING",
+                     "lines": [json.loads(line) for line in lines.splitlines() if line.strip()],
+                     "done_at": time.monotonic() + self.bulk_delay, "results": b''}
+        self.bulk_operations[operation_id] = operation
+        return {"bulkOperationRunMutation": {"bulkOperation": {"id": operation["id"], "status": "CREATED"},
+                                             "userErrors": []}}
+
+    def _bulk_status(self, gid):
+        operation_id = gid.rsplit('/', 1)[-1]
+        operation = self.bulk_operations.get(operation_id)
+        if operation is None:
+            return None
+        if operation['status'] == 'RUNNING' and time.monotonic() >= operation['done_at']:
+            results = [json.dumps({"data": {"productCreate": self._product_create(line.get('input') or {})},
+                                   "__lineNumber": number})
+                       for number, line in enumerate(operation['lines'])]
+            operation.update(status='COMPLETED', results=("\n".join(results) + "\n").encode('utf-8'))
+        completed = operation['status'] == 'COMPLETED'
+        return {"id": operation["id"], "status": operation['status'], "errorCode": None,
+                "objectCount": str(len(operation['lines']) if completed else 0),
+                "url": f"{self.url}/bulk/{operation_id}.jsonl" if completed else None, "partialDataUrl": None}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local stand-ins for the OpenAI and Shopify APIs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--openai-port", type=int, default=8100)
+    parser.add_argument("--shopify-port", type=int, default=8200)
+    parser.add_argument("--chat-latency", type=float, default=0.5, help="median chat completion latency (s)")
+    parser.add_argument("--image-latency", type=float, default=2.0, help="median image generation latency (s)")
+    parser.add_argument("--shopify-latency", type=float, default=0.1, help="median Shopify call latency (s)")
+    parser.add_argument("--openai-rpm", type=int, default=500, help="OpenAI requests per minute before 429s")
+    parser.add_argument("--bucket-size", type=int, default=40,
+                        help="Shopify call-limit bucket (40 = standard plan, 400 = Plus)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with a 5xx")
+    args = parser.parse_args(argv)
+
+    openai_server = FakeOpenAIServer(args.host, args.openai_port, Latency(args.chat_latency),
+                                     Latency(args.image_latency), args.openai_rpm, args.error_rate).start()
+    shopify_server = FakeShopifyServer(args.host, args.shopify_port, Latency(args.shopify_latency),
+                                       args.bucket_size, args.error_rate).start()
+    print("🧪 Stand-in servers running. Point the pipeline at them with:")
+    print(f"   OPENAI_BASE_URL={openai_server.base_url}")
+    print(f"   SHOPIFY_API_BASE_URL={shopify_server.api_url}")
+    print("Press Ctrl-C to stop.")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print(f"\n⏹️ Stopping ({openai_server.requests} OpenAI and {shopify_server.requests} Shopify requests served)")
+        openai_server.stop()
+        shopify_server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+Merch Maker Lite - Durable Job Queue
+====================================
+
+SQLite-backed queue of product jobs, worked by a pool of threads. Every
+stage a job completes is checkpointed, so after a crash or Ctrl-C a rerun
+resumes each job at the stage that failed instead of paying for
+generation again.
+
+Shopify writes are idempotent: each job has an idempotency key, which is
+added to the product as a ``merch-job-<key>`` tag and stored with the
+created product id. Before creating a product the worker checks both (the
+tag via the catalog mirror), so a retry never creates a second product.
+
+Jobs are leased while running; a job whose worker died is picked up again
+once its lease expires. Set MERCH_METRICS_PORT to scrape live metrics
+from ``/metrics`` while the workers run.
+
+Usage:
+    python job_queue.py enqueue 500          # queue 500 new products
+    python job_queue.py work --workers 4     # work the queue until it is empty
+    python job_queue.py status
+    python job_queue.py retry-failed
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import sqlite3
+import argparse
+import threading
+import contextvars
+from contextlib import contextmanager
+from pathlib import Path
+
+from artifacts import RunArtifacts
+from dedup import DuplicateProductError
+from metrics import METRICS_PORT, export, metrics, report
+from pipeline import GeneratedProduct, Mockup, Pipeline, ShopifyUpload
+from product_model import ProductValidationError
+
+DEFAULT_DB_PATH = os.getenv('MERCH_JOB_DB', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '.cache', 'jobs.sqlite3'))
+JOB_STAGES = ('generate', 'mockup', 'create_product', 'attach_mockup')
+IDEMPOTENCY_TAG_PREFIX = 'merch-job-'
+# Errors that a retry cannot fix
+PERMANENT_ERRORS = (DuplicateProductError, ProductValidationError)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    status TEXT NOT NULL DEFAULT 'queued',
+    stage TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    shopify_product_id INTEGER,
+    worker TEXT,
+    lease_expires REAL,
+    available_at REAL NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, available_at);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    job_id INTEGER NOT NULL,
+    stage TEXT NOT NULL,
+    output TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (job_id, stage)
+);
+'''
+
+
+def idempotency_tag(key):
+    return f"{IDEMPOTENCY_TAG_PREFIX}{key}".lower()
+
+
+class JobQueue:
+    """Jobs and their stage checkpoints in SQLite"""
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, max_attempts=5, lease_seconds=900, base_delay=30.0):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.base_delay = base_delay
+        if db_path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        # Autocommit mode: transactions are explicit (BEGIN IMMEDIATE) so claims are atomic
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            if db_path != ':memory:':
+                self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+
+    # --- Producers ---
+    def enqueue(self, idempotency_key=None):
+        """Queue a job; returns its id (an existing key returns the existing job)"""
+        key = idempotency_key or uuid.uuid4().hex
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute('INSERT OR IGNORE INTO jobs (idempotency_key, created_at, updated_at) VALUES (?, ?, ?)',
+                         (key, now, now))
+            return conn.execute('SELECT id FROM jobs WHERE idempotency_key = ?', (key,)).fetchone()['id']
+
+    def retry_failed(self):
+        """Requeue permanently failed jobs; returns how many"""
+        with self._transaction() as conn:
+            cursor = conn.execute("UPDATE jobs SET status = 'queued', attempts = 0, available_at = 0, "
+                                  "updated_at = ? WHERE status = 'failed'", (time.time(),))
+            return cursor.rowcount
+
+    # --- Workers ---
+    def claim(self, worker):
+        """Lease the next runnable job (queued, or running with an expired lease), or None"""
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE (status = 'queued' AND available_at <= ?) "
+                "OR (status = 'running' AND lease_expires < ?) ORDER BY id LIMIT 1", (now, now)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE jobs SET status = 'running', worker = ?, lease_expires = ?, updated_at = ? "
+                         "WHERE id = ?", (worker, now + self.lease_seconds, now, row['id']))
+            return dict(row)
+
+    def checkpoints(self, job_id):
+        with self._lock:
+            rows = self._conn.execute('SELECT stage, output FROM checkpoints WHERE job_id = ?', (job_id,))
+            return {row['stage']: json.loads(row['output']) for row in rows}
+
+    def checkpoint(self, job_id, stage, output, shopify_product_id=None):
+        """Record a finished stage (and renew the job's lease)"""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute('INSERT OR REPLACE INTO checkpoints (job_id, stage, output, created_at) VALUES (?, ?, ?, ?)',
+                         (job_id, stage, json.dumps(output, default=str), now))
+            conn.execute('UPDATE jobs SET stage = ?, lease_expires = ?, updated_at = ?, '
+                         'shopify_product_id = COALESCE(?, shopify_product_id) WHERE id = ?',
+                         (stage, now + self.lease_seconds, now, shopify_product_id, job_id))
+
+    def complete(self, job_id):
+        with self._transaction() as conn:
+            conn.execute("UPDATE jobs SET status = 'done', error = NULL, worker = NULL, lease_expires = NULL, "
+                         "updated_at = ? WHERE id = ?", (time.time(), job_id))
+
+    def fail(self, job_id, error, permanent=False):
+        """Record a failed attempt; the job is retried with backoff until max_attempts"""
+        now = time.time()
+        with self._transaction() as conn:
+            attempts = conn.execute('SELECT attempts FROM jobs WHERE id = ?', (job_id,)).fetchone()['attempts'] + 1
+            status = 'failed' if permanent or attempts >= self.max_attempts else 'queued'
+            delay = min(self.base_delay * 2 ** (attempts - 1), 3600) * random.uniform(0.5, 1.0)
+            conn.execute('UPDATE jobs SET status = ?, attempts = ?, error = ?, worker = NULL, lease_expires = NULL, '
+                         'available_at = ?, updated_at = ? WHERE id = ?',
+                         (status, attempts, str(error), now + delay, now, job_id))
+            return status
+
+    def release(self, job_id):
+        """Give a claimed job back without counting an attempt (e.g. on Ctrl-C)"""
+        with self._transaction() as conn:
+            conn.execute("UPDATE jobs SET status = 'queued', worker = NULL, lease_expires = NULL, updated_at = ? "
+                         "WHERE id = ? AND status = 'running'", (time.time(), job_id))
+
+    def release_workers(self, workers):
+        """Give back every job claimed by ``workers``; returns how many"""
+        workers = list(workers)
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL, lease_expires = NULL, updated_at = ? "
+                f"WHERE status = 'running' AND worker IN ({', '.join('?' * len(workers))})",
+                (time.time(), *workers))
+            return cursor.rowcount
+
+    def counts(self):
+        with self._lock:
+            rows = self._conn.execute('SELECT status, COUNT(*) AS n FROM jobs GROUP BY status')
+            return {row['status']: row['n'] for row in rows}
+
+    def pending(self):
+        """Jobs that are queued (possibly waiting for a retry) or running"""
+        counts = self.counts()
+        return counts.get('queued', 0) + counts.get('running', 0)
+
+
+class JobWorker:
+    """Runs queued jobs through the pipeline stages, resuming from checkpoints"""
+
+    def __init__(self, queue, pipeline=None, name=None, sync_interval=5.0):
+        self.queue = queue
+        self.pipeline = pipeline or Pipeline()
+        self.name = name or f"{os.getpid()}-{threading.get_ident()}"
+        # The catalog mirror is synced at most this often, however many jobs the workers create
+        self.sync_interval = sync_interval
+
+    # --- Stages ---
+    def _generate(self, job, done, run):
+        generated = self.pipeline.generate(run=run, variant=job['idempotency_key'])
+        if generated.product is None:
+            raise ProductValidationError("Product generator did not return valid product JSON")
+        return {'product': generated.product, 'image_path': str(generated.image_path)}
+
+    def _mockup(self, job, done, run):
+        generated = GeneratedProduct(product=done['generate']['product'],
+                                     image_path=Path(done['generate']['image_path']))
+        mockup = self.pipeline.mockup(generated, run=run)
+        return {'path': str(mockup.path), 'metadata': mockup.metadata}
+
+    def _create_product(self, job, done, run):
+        tag = idempotency_tag(job['idempotency_key'])
+        product_data = dict(done['generate']['product'])
+        product_data['tags'] = list(product_data.get('tags', [])) + [tag]
+        shopify = self.pipeline.shopify
+
+        # Never create twice: reuse the product recorded for this job, or one carrying its tag
+        existing = None
+        if job.get('shopify_product_id'):
+            existing = {'id': job['shopify_product_id'], 'title': product_data.get('title'), 'status': 'draft'}
+        else:
+            self.pipeline.sync_catalog(max_age=self.sync_interval)
+            tagged = self.pipeline.catalog.find_by_tag(tag)
+            existing = tagged[0] if tagged else None
+        if existing:
+            print(f"♻️ Job {job['id']}: product already created (ID: {existing['id']})")
+            admin_url = f"https://{shopify.shop_url}/admin/products/{existing['id']}"
+            return {'product': existing, 'admin_url': admin_url}
+
+        # The mockup is rendered by now: send it in the create request (one call, no imageless draft)
+        mockup = Mockup(path=Path(done['mockup']['path']), metadata=done['mockup']['metadata'])
+        upload = self.pipeline.upload(product_data, mockup)
+        if not upload:
+            raise RuntimeError("Failed to create the product in Shopify")
+        return {'product': upload.product, 'admin_url': upload.admin_url}
+
+    def _attach_mockup(self, job, done, run):
+        upload = ShopifyUpload(**done['create_product'])
+        if upload.product.get('images'):
+            return {'image_id': upload.product['images'][0].get('id')}  # attached when it was created
+        # A product found by its tag (or created by an older run) may still lack the mockup
+        mockup = Mockup(path=Path(done['mockup']['path']), metadata=done['mockup']['metadata'])
+        image_id = self.pipeline.attach_mockup(upload, mockup)
+        if not image_id:
+            raise RuntimeError("Failed to upload the mockup image")
+        return {'image_id': image_id}
+
+    # --- Jobs ---
+    def process(self, job, stop=None):
+        """Run a claimed job's remaining stages; returns True when it finishes.
+
+        Once ``stop`` is set the job is handed back before its next stage.
+        """
+        handlers = {'generate': self._generate, 'mockup': self._mockup,
+                    'create_product': self._create_product, 'attach_mockup': self._attach_mockup}
+        run = RunArtifacts(f"job-{job['id']:06d}")
+        done = self.queue.checkpoints(job['id'])
+        stage = None
+        try:
+            for stage in JOB_STAGES:
+                if stage in done:
+                    continue
+                if stop is not None and stop.is_set():
+                    self.queue.release(job['id'])
+                    return False
+                with metrics.timer('merch_stage_seconds', stage=stage):
+                    output = handlers[stage](job, done, run)
+                product_id = output['product']['id'] if stage == 'create_product' else None
+                self.queue.checkpoint(job['id'], stage, output, shopify_product_id=product_id)
+                done[stage] = output
+        except KeyboardInterrupt:
+            self.queue.release(job['id'])
+            raise
+        except Exception as e:
+            status = self.queue.fail(job['id'], f"{stage}: {e}", permanent=isinstance(e, PERMANENT_ERRORS))
+            metrics.inc('merch_jobs_total', status='retried' if status == 'queued' else 'failed')
+            print(f"❌ Job {job['id']} failed at {stage}: {e} ({'will retry' if status == 'queued' else 'giving up'})")
+            return False
+        self.queue.complete(job['id'])
+        metrics.inc('merch_jobs_total', status='done')
+        print(f"✅ Job {job['id']} done: {done['generate']['product'].get('title')} "
+              f"(ID: {done['create_product']['product']['id']})")
+        return True
+
+    def run(self, stop=None, idle_exit=True, poll_interval=5.0):
+        """Work jobs until ``stop`` is set (or, with ``idle_exit``, nothing is left to do)"""
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            job = self.queue.claim(self.name)
+            if job is None:
+                if idle_exit and not self.queue.pending():
+                    return
+                stop.wait(poll_interval)  # retries waiting out their backoff
+                continue
+            self.process(job, stop)
+
+
+def work(queue, workers=4, pipeline=None):
+    """Work the queue with a pool of threads sharing one pipeline"""
+    pipeline = pipeline or Pipeline()
+    # Build the shared clients before the workers start, so they don't race to create their own
+    _ = pipeline.shopify, pipeline.catalog, pipeline.dedup
+    with metrics.scope() as session_metrics:  # this work session's metrics only
+        _work(queue, workers, pipeline, session_metrics)
+
+def _work(queue, workers, pipeline, session_metrics):
+    if METRICS_PORT:
+        metrics.serve(METRICS_PORT)
+    stop = threading.Event()
+    names = [f"{os.getpid()}-{n}" for n in range(workers)]
+    # Each worker runs in a copy of this context, so it records into the session's metrics
+    threads = [threading.Thread(target=contextvars.copy_context().run,
+                                args=(JobWorker(queue, pipeline, name=name).run,), kwargs={'stop': stop}, daemon=True)
+               for name in names]
+    for thread in threads:
+        thread.start()
+    try:
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=0.5)
+    except KeyboardInterrupt:
+        # Only this thread sees Ctrl-C: let the workers finish their current stage and hand
+        # their jobs back, instead of releasing jobs that are still being worked
+        stop.set()
+        print("\n⏹️ Stopping after the stages in progress (Ctrl-C again to stop now)...")
+        try:
+            for thread in threads:
+                thread.join()
+        finally:
+            # Anything still claimed (e.g. after a second Ctrl-C) is released rather than left to its lease
+            queue.release_workers(names)
+        print("⏹️ In-flight jobs resume from their last checkpoint next time")
+        raise
+    finally:
+        export(registry=session_metrics)
+        print(f"📈 Metrics:\n{report(session_metrics)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Durable product job queue")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="queue database path")
+    commands = parser.add_subparsers(dest="command", required=True)
+    enqueue = commands.add_parser("enqueue", help="queue new product jobs")
+    enqueue.add_argument("count", type=int)
+    worker = commands.add_parser("work", help="work the queue until it is empty")
+    worker.add_argument("--workers", type=int, default=4)
+    commands.add_parser("status", help="show job counts")
+    commands.add_parser("retry-failed", help="requeue failed jobs")
+    args = parser.parse_args(argv)
+
+    queue = JobQueue(args.db)
+    if args.command == "enqueue":
+        for _ in range(args.count):
+            queue.enqueue()
+        print(f"📥 Queued {args.count} jobs")
+    elif args.command == "work":
+        try:
+            work(queue, args.workers)
+        except KeyboardInterrupt:
+            sys.exit(130)
+    elif args.command == "retry-failed":
+        print(f"🔁 Requeued {queue.retry_failed()} failed jobs")
+    print(f"📊 Jobs: {queue.counts()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Merch Maker Lite - Keyword Extraction
+=====================================
+
+Corpus-level keyword engine: descriptions are tokenized with a precompiled
+pattern, document frequencies are kept for the whole corpus, and each
+description's keywords are its top-k terms by TF-IDF rather than every
+non-stopword. The corpus can grow incrementally and is saved in SQLite,
+so backfills, later batches and concurrent runs share the same
+statistics. Documents are keyed on a content hash, so adding the same
+description twice (e.g. re-tagging a file) counts it once.
+
+product_generator ranks each new product's keywords with the shared
+corpus (MERCH_KEYWORD_CORPUS) and adds the product once it has passed
+the near-duplicate check.
+
+Usage:
+    python keywords.py batch_output/products.jsonl                  # tag a batch file
+    python keywords.py catalog.jsonl --top 10 --output tagged.jsonl
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import heapq
+import sqlite3
+import hashlib
+import argparse
+import threading
+from collections import Counter
+
+DEFAULT_CORPUS_PATH = os.getenv('MERCH_KEYWORD_CORPUS', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '.cache', 'keyword_corpus.sqlite3'))
+DEFAULT_TOP_K = 8
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS docs (hash TEXT PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS terms (term TEXT PRIMARY KEY, df INTEGER NOT NULL);
+'''
+
+# Stopwords used by extract_keywords (kept as-is for compatible output)
+STOPWORDS = frozenset(['the', 'a', 'an', 'and', 'or', 'for', 'of', 'to', 'in', 'on', 'with', 'is', 'this',
+                       'that', 'it', 'as', 'at', 'by', 'from'])
+
+# The engine also drops common filler and words every merch description shares
+ENGINE_STOPWORDS = STOPWORDS | frozenset([
+    'are', 'be', 'but', 'can', 'has', 'have', 'its', 'not', 'our', 'was', 'were', 'will', 'you', 'your',
+    'all', 'any', 'into', 'just', 'more', 'most', 'than', 'them', 'they', 'their', 'these', 'those', 'who',
+    'what', 'when', 'where', 'which', 'while', 'how', 'out', 'over', 'about', 'every', 'each', 'one',
+    'shirt', 'shirts', 't-shirt', 't-shirts', 'tee', 'tees', 'design', 'designs', 'perfect', 'featuring',
+    'features', 'great', 'make', 'makes', 'wear', 'show', 'off',
+])
+
+_STRIP_CHARS = '.,!?'
+# Engine tokens: letters/digits with inner apostrophes or hyphens
+_TOKEN = re.compile(r"[a-z0-9]+(?:['-][a-z0-9]+)*")
+
+
+def extract_keywords(description):
+    """Every distinct non-stopword longer than two characters, sorted"""
+    words = {w.strip(_STRIP_CHARS) for w in description.lower().split()}
+    return sorted(w for w in words if len(w) > 2 and w not in STOPWORDS)
+
+
+class KeywordEngine:
+    """TF-IDF keyword ranking over a growing corpus of descriptions.
+
+    Statistics live in memory; with a ``path`` they are loaded from and
+    saved to an SQLite corpus. save() only writes the documents added or
+    removed since the last save, so engines in other processes can share
+    the same corpus without overwriting each other.
+    """
+
+    def __init__(self, stopwords=ENGINE_STOPWORDS, min_length=3, path=None):
+        self.stopwords = frozenset(stopwords)
+        self.path = path
+        self.min_length = min_length
+        self.doc_freq = Counter()
+        self.num_docs = 0
+        # Documents added or removed since the last save: hash -> (added, terms)
+        self.doc_hashes = {}
+        self._conn = None
+        self._lock = threading.RLock()
+
+    def tokenize(self, text):
+        stopwords, min_length = self.stopwords, self.min_length
+        return [t for t in _TOKEN.findall((text or '').lower())
+                if len(t) >= min_length and t not in stopwords and not t.isdigit()]
+
+    # --- Corpus ---
+    @staticmethod
+    def doc_hash(text):
+        return hashlib.sha256((text or '').strip().encode('utf-8')).hexdigest()[:16]
+
+    def _saved(self, digest):
+        if self._conn is None:
+            return False
+        return self._conn.execute('SELECT 1 FROM docs WHERE hash = ?', (digest,)).fetchone() is not None
+
+    def _has(self, digest):
+        if digest in self.doc_hashes:
+            return self.doc_hashes[digest][0]
+        return self._saved(digest)
+
+    def add_documents(self, texts):
+        """Add descriptions to the corpus statistics (ones already in it are skipped)"""
+        with self._lock:
+            for text in texts:
+                self._add_tokens(self.tokenize(text), self.doc_hash(text))
+        return self
+
+    def remove_documents(self, texts):
+        """Remove descriptions previously added (e.g. deleted products)"""
+        with self._lock:
+            for text in texts:
+                digest = self.doc_hash(text)
+                if not self._has(digest):
+                    continue
+                terms = set(self.tokenize(text))
+                if self.doc_hashes.pop(digest, None) is None:
+                    self.doc_hashes[digest] = (False, terms)  # saved earlier: delete it on save
+                self.doc_freq.subtract(terms)
+                self.num_docs = max(self.num_docs - 1, 0)
+            self.doc_freq = +self.doc_freq
+        return self
+
+    def _add_tokens(self, tokens, digest):
+        if self._has(digest):
+            return
+        terms = set(tokens)
+        if self.doc_hashes.pop(digest, None) is None:
+            self.doc_hashes[digest] = (True, terms)
+        self.doc_freq.update(terms)
+        self.num_docs += 1
+
+    def idf(self, term):
+        # Smoothed, so unseen terms still rank (and rank highest)
+        return math.log((1 + self.num_docs) / (1 + self.doc_freq.get(term, 0))) + 1
+
+    # --- Ranking ---
+    def _rank(self, tokens, k):
+        if not tokens:
+            return []
+        counts = Counter(tokens)
+        total = len(tokens)
+        scored = ((count / total * self.idf(term), term) for term, count in counts.items())
+        # Ties break alphabetically so results are stable
+        return [term for _, term in heapq.nsmallest(k, ((-score, term) for score, term in scored))]
+
+    def top_keywords(self, text, k=DEFAULT_TOP_K):
+        """Top ``k`` keywords of one description against the current corpus"""
+        return self._rank(self.tokenize(text), k)
+
+    def extract_batch(self, texts, k=DEFAULT_TOP_K, update=True):
+        """Keywords for many descriptions in one pass.
+
+        With ``update`` the descriptions are added to the corpus first, so
+        terms common across the batch are ranked down.
+        """
+        texts = list(texts)
+        token_lists = [self.tokenize(text) for text in texts]
+        with self._lock:
+            if update:
+                for text, tokens in zip(texts, token_lists):
+                    self._add_tokens(tokens, self.doc_hash(text))
+            return [self._rank(tokens, k) for tokens in token_lists]
+
+    def product_keywords(self, product, k=DEFAULT_TOP_K, update=True):
+        """Keywords for a product dict (title and description)"""
+        return self.extract_batch([product_text(product)], k, update)[0]
+
+    # --- Persistence ---
+    def _connect(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+        return conn
+
+    def _refresh(self):
+        """Reload the statistics from the corpus (picking up other writers' documents)"""
+        self.doc_freq = Counter(dict(self._conn.execute('SELECT term, df FROM terms')))
+        self.num_docs = self._conn.execute('SELECT COUNT(*) FROM docs').fetchone()[0]
+
+    def save(self, path=None):
+        """Write the documents added or removed since the last save to the corpus"""
+        path = path or self.path
+        if not path:
+            return  # an in-memory corpus
+        with self._lock:
+            if self._conn is None or path != self.path:
+                self._conn, self.path = self._connect(path), path
+            with self._conn:
+                for digest, (added, terms) in self.doc_hashes.items():
+                    if added:
+                        # Ignored if another writer saved the same document first
+                        cursor = self._conn.execute('INSERT OR IGNORE INTO docs (hash) VALUES (?)', (digest,))
+                        if cursor.rowcount:
+                            self._conn.executemany('INSERT INTO terms (term, df) VALUES (?, 1) '
+                                                   'ON CONFLICT(term) DO UPDATE SET df = df + 1',
+                                                   [(term,) for term in terms])
+                    elif self._conn.execute('DELETE FROM docs WHERE hash = ?', (digest,)).rowcount:
+                        self._conn.executemany('UPDATE terms SET df = df - 1 WHERE term = ?',
+                                               [(term,) for term in terms])
+                self._conn.execute('DELETE FROM terms WHERE df <= 0')
+            self.doc_hashes = {}
+            self._refresh()
+
+    @classmethod
+    def load(cls, path=DEFAULT_CORPUS_PATH, **kwargs):
+        """Load saved corpus statistics (an empty engine if there are none)"""
+        engine = cls(path=path, **kwargs)
+        if os.path.exists(path):
+            engine._conn = engine._connect(path)
+            engine._refresh()
+        return engine
+
+
+def product_text(product):
+    return f"{product.get('title', '')} {product.get('description') or product.get('body_html') or ''}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tag products with TF-IDF keywords")
+    parser.add_argument("input", help="JSONL file of products (e.g. batch_output/products.jsonl)")
+    parser.add_argument("--output", help="write tagged JSONL here (default: stdout)")
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP_K, help="keywords per product")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS_PATH, help="corpus statistics file")
+    parser.add_argument("--no-update", action="store_true", help="don't add these products to the corpus")
+    args = parser.parse_args(argv)
+
+    rows = []
+    with open(args.input, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                rows.append(json.loads(line))
+    # Batch files wrap each product in {"index", "product", ...}
+    products = [row.get('product') if 'index' in row else row for row in rows]
+    tagged = [p for p in products if p]
+
+    engine = KeywordEngine.load(args.corpus)
+    keywords = engine.extract_batch([product_text(p) for p in tagged], args.top, update=not args.no_update)
+    for product, words in zip(tagged, keywords):
+        product['keywords'] = words
+    if not args.no_update:
+        engine.save(args.corpus)
+
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for row in rows:
+            out.write(json.dumps(row) + "\n")
+    finally:
+        if args.output:
+            out.close()
+    print(f"✅ Tagged {len(tagged)} products ({engine.num_docs} documents in corpus)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""
+Merch Maker Lite - Metrics
+==========================
+
+Process-wide counters, gauges and latency histograms for the pipeline:
+stage wall time, OpenAI latency and token usage, Shopify latency, retries
+and call-limit bucket fill, and bytes uploaded. Together they show
+whether a run is limited by OpenAI, rendering or Shopify.
+
+Metrics are exported in the Prometheus text format (as a file for the
+node_exporter textfile collector, or served on ``/metrics``) and as a
+JSON summary saved with each run. The process-wide registry is never
+reset: each run records into its own scope as well (``metrics.scope()``),
+so concurrent runs and job workers report only their own calls. Scopes
+follow the context, so threads started for a run must run in a copy of
+it (``contextvars.copy_context().run``).
+
+Usage:
+    from metrics import metrics
+    with metrics.timer('merch_stage_seconds', stage='mockup'):
+        ...
+    metrics.inc('merch_shopify_retries_total', reason='429')
+    with metrics.scope() as run_metrics:
+        ...
+    export(run, run_metrics)  # runs/<run_id>/metrics.json (+ MERCH_METRICS_FILE)
+"""
+
+import os
+import math
+import time
+import bisect
+import tempfile
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Prometheus textfile to (over)write at the end of each run, and port to serve /metrics on
+METRICS_FILE = os.getenv('MERCH_METRICS_FILE')
+METRICS_PORT = int(os.getenv('MERCH_METRICS_PORT', 0))
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# Recent observations kept per histogram series for the JSON percentiles
+MAX_SAMPLES = 10000
+# Registries of the runs active in the current context (see Metrics.scope)
+_scopes = contextvars.ContextVar('merch_metrics_scopes', default=())
+
+HELP = {
+    'merch_stage_seconds': 'Wall time of pipeline stages',
+    'merch_product_seconds': 'End-to-end time per product',
+    'merch_openai_request_seconds': 'OpenAI API call latency',
+    'merch_openai_requests_total': 'OpenAI API calls made',
+    'merch_openai_tokens_total': 'OpenAI tokens used',
+    'merch_openai_retries_total': 'OpenAI API calls retried',
+    'merch_shopify_request_seconds': 'Shopify Admin API call latency',
+    'merch_shopify_requests_total': 'Shopify Admin API calls made',
+    'merch_shopify_retries_total': 'Shopify Admin API calls retried',
+    'merch_shopify_call_limit_fill': 'Shopify REST call-limit bucket fill (0-1)',
+    'merch_shopify_upload_bytes_total': 'Bytes of file data (images, bulk files) uploaded to Shopify',
+    'merch_jobs_total': 'Queued jobs finished, by outcome',
+}
+
+
+def _series(name, labels):
+    """Prometheus series name, e.g. merch_stage_seconds{stage="mockup"}"""
+    if not labels:
+        return name
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return name + '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + '}'
+
+
+def percentile(values, q):
+    """Nearest-rank percentile (``q`` in 0-100) of a sorted list"""
+    if not values:
+        return None
+    index = max(0, min(len(values) - 1, math.ceil(q / 100.0 * len(values)) - 1))
+    return values[index]
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.samples = deque(maxlen=MAX_SAMPLES)
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.samples.append(value)
+
+    def summary(self):
+        values = sorted(self.samples)
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+            "max": values[-1] if values else None,
+        }
+
+
+class Metrics:
+    """Thread-safe metric registry; series are keyed by name and labels"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, scoped=False):
+        self.buckets = tuple(buckets)
+        # Only the process-wide registry fans out to the active run scopes
+        self.scoped = scoped
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Drop every series"""
+        with self._lock:
+            self._counters = {}
+            self._gauges = {}
+            self._histograms = {}
+            self.started = time.time()
+
+    @contextmanager
+    def scope(self):
+        """Also record into a fresh registry while the block runs (in this context)"""
+        registry = Metrics(self.buckets)
+        token = _scopes.set(_scopes.get() + (registry,))
+        try:
+            yield registry
+        finally:
+            _scopes.reset(token)
+
+    def _registries(self):
+        return (self, *_scopes.get()) if self.scoped else (self,)
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        for registry in self._registries():
+            with registry._lock:
+                registry._counters[key] = registry._counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        key = self._key(name, labels)
+        for registry in self._registries():
+            with registry._lock:
+                registry._gauges[key] = value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        for registry in self._registries():
+            with registry._lock:
+                histogram = registry._histograms.get(key)
+                if histogram is None:
+                    histogram = registry._histograms[key] = _Histogram(registry.buckets)
+                histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Observe the wall time of the block (also when it raises)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def to_prometheus(self):
+        """All series in the Prometheus text exposition format"""
+        with self._lock:
+            families = {}
+            for (name, labels), value in self._counters.items():
+                families.setdefault((name, 'counter'), []).append(f"{_series(name, labels)} {value}")
+            for (name, labels), value in self._gauges.items():
+                families.setdefault((name, 'gauge'), []).append(f"{_series(name, labels)} {value}")
+            for (name, labels), histogram in self._histograms.items():
+                lines = families.setdefault((name, 'histogram'), [])
+                cumulative = 0
+                for bound, count in zip([*histogram.buckets, '+Inf'], histogram.counts):
+                    cumulative += count
+                    lines.append(f"{_series(name + '_bucket', labels + (('le', bound),))} {cumulative}")
+                lines.append(f"{_series(name + '_sum', labels)} {histogram.sum}")
+                lines.append(f"{_series(name + '_count', labels)} {histogram.count}")
+        out = []
+        for (name, kind), lines in sorted(families.items()):
+            out.append(f"# HELP {name} {HELP.get(name, name)}")
+            out.append(f"# TYPE {name} {kind}")
+            out.extend(lines)
+        return "\n".join(out) + "\n"
+
+    def summary(self):
+        """JSON-serialisable snapshot: counters, gauges and histogram percentiles"""
+        with self._lock:
+            return {
+                "started_at": self.started,
+                "elapsed_seconds": round(time.time() - self.started, 3),
+                "counters": {_series(name, labels): value for (name, labels), value in sorted(self._counters.items())},
+                "gauges": {_series(name, labels): value for (name, labels), value in sorted(self._gauges.items())},
+                "histograms": {_series(name, labels): histogram.summary()
+                               for (name, labels), histogram in sorted(self._histograms.items())},
+            }
+
+    def total(self, name, **labels):
+        """Sum of a counter over every series matching ``labels``"""
+        wanted = set(labels.items())
+        with self._lock:
+            return sum(value for (series_name, series_labels), value in self._counters.items()
+                       if series_name == name and wanted <= set(series_labels))
+
+    def histogram(self, name, **labels):
+        """Summary (count, sum, percentiles) of one histogram series, or None"""
+        with self._lock:
+            histogram = self._histograms.get(self._key(name, labels))
+            return histogram.summary() if histogram else None
+
+    def write_prometheus(self, path):
+        """Atomically write the Prometheus text file (for the textfile collector)"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+        return path
+
+    def serve(self, port=METRICS_PORT, host='0.0.0.0'):
+        """Serve ``/metrics`` from a background thread; returns the server"""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.to_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"📈 Serving metrics on http://{host}:{server.server_port}/metrics")
+        return server
+
+
+# Process-wide registry
+metrics = Metrics(scoped=True)
+
+
+def record_openai(kind, seconds, usage=None):
+    """Record one successful OpenAI call (``kind`` is 'chat' or 'image')"""
+    metrics.observe('merch_openai_request_seconds', seconds, kind=kind)
+    metrics.inc('merch_openai_requests_total', kind=kind)
+    for field in ('prompt_tokens', 'completion_tokens'):
+        tokens = getattr(usage, field, None) if usage is not None else None
+        if tokens:
+            metrics.inc('merch_openai_tokens_total', tokens, kind=kind, type=field.split('_')[0])
+
+
+def report(registry=metrics):
+    """Per-stage times and the OpenAI/Shopify totals, one line each"""
+    lines = []
+    for series, stats in registry.summary()["histograms"].items():
+        if series.startswith(('merch_stage_seconds', 'merch_openai_request_seconds',
+                              'merch_shopify_request_seconds')):
+            lines.append(f"   {series:<52} n={stats['count']:<5} total={stats['sum']:8.2f}s "
+                         f"p50={stats['p50']:.3f}s p95={stats['p95']:.3f}s")
+    lines.append(f"   OpenAI: {registry.total('merch_openai_requests_total')} calls, "
+                 f"{registry.total('merch_openai_tokens_total')} tokens, "
+                 f"{registry.total('merch_openai_retries_total')} retries")
+    lines.append(f"   Shopify: {registry.total('merch_shopify_requests_total')} calls, "
+                 f"{registry.total('merch_shopify_retries_total')} retries, "
+                 f"{registry.total('merch_shopify_upload_bytes_total') / 1024:.0f} KB uploaded")
+    return "\n".join(lines)
+
+
+def export(run=None, registry=metrics, prometheus_file=METRICS_FILE):
+    """Save the JSON summary in the run (as metrics.json) and the Prometheus file, if configured"""
+    summary = registry.summary()
+    if run is not None:
+        run.write_json('metrics.json', summary)
+    if prometheus_file:
+        registry.write_prometheus(prometheus_file)
+    return summary
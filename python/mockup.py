@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Merch Maker Lite - Mockup Compositor
+====================================
+
+In-process replacement for js/mockup_visualizer.js: draws the product
+image centered on the template at 60% of its size, the same placement as
+createMockup(). Decoded templates are cached in memory, so a long-running
+pipeline decodes each template once instead of once per product, and
+renders can be returned as bytes without touching the filesystem.
+
+Output encoding is configurable (MOCKUP_FORMAT, MOCKUP_QUALITY,
+MOCKUP_MAX_DIMENSION, MOCKUP_TARGET_KB): with a byte target, lossy
+formats binary-search for the highest quality that fits, and oversized
+PNGs are palette-quantized. The settings used and the resulting size are
+recorded in mockup.json.
+
+Usage:
+    python mockup.py [productImage] [outputMockup] [template]
+"""
+
+import io
+import os
+import sys
+import json
+from functools import lru_cache
+from pathlib import Path
+
+from PIL import Image
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_PRODUCT_IMAGE = BASE_DIR / 'python' / 'generated_image.png'
+DEFAULT_TEMPLATE = BASE_DIR / 'js' / 'template.png'
+DEFAULT_OUTPUT = BASE_DIR / 'js' / 'mockup.png'
+
+# Product image size relative to the template (as in createMockup())
+PRODUCT_SCALE = 0.6
+
+# Output encoding (defaults keep the original full-size PNG)
+MOCKUP_FORMAT = os.getenv('MOCKUP_FORMAT', 'PNG').upper()
+MOCKUP_QUALITY = int(os.getenv('MOCKUP_QUALITY', 85))
+MOCKUP_MAX_DIMENSION = int(os.getenv('MOCKUP_MAX_DIMENSION', 0)) or None
+MOCKUP_TARGET_BYTES = int(float(os.getenv('MOCKUP_TARGET_KB', 0)) * 1024) or None
+# Lowest quality the byte-target search may go down to
+MIN_QUALITY = 40
+
+EXTENSIONS = {'PNG': '.png', 'JPEG': '.jpg', 'WEBP': '.webp'}
+
+
+@lru_cache(maxsize=16)
+def _decode_template(path, mtime):
+    image = Image.open(path)
+    image.load()
+    return image.convert('RGBA')
+
+
+def load_template(template_path=DEFAULT_TEMPLATE):
+    """Decoded RGBA template, cached until the file changes (do not modify it)"""
+    path = os.path.abspath(template_path)
+    return _decode_template(path, os.path.getmtime(path))
+
+
+def placement(template_size, scale=PRODUCT_SCALE):
+    """(x, y, width, height) of the product image on a template of ``template_size``"""
+    width, height = template_size
+    img_w = width * scale
+    img_h = height * scale
+    return round((width - img_w) / 2), round((height - img_h) / 2), round(img_w), round(img_h)
+
+
+def _open_image(image):
+    if isinstance(image, Image.Image):
+        return image
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        image = io.BytesIO(image)
+    return Image.open(image)
+
+
+def composite(product_image, template=DEFAULT_TEMPLATE, scale=PRODUCT_SCALE):
+    """Draw ``product_image`` (path, bytes or Image) centered on ``template`` (path or Image)"""
+    if not isinstance(template, Image.Image):
+        template = load_template(template)
+    x, y, width, height = placement(template.size, scale)
+    with _open_image(product_image) as product:
+        overlay = product.convert('RGBA').resize((width, height), Image.Resampling.BICUBIC)
+    canvas = template.copy()
+    canvas.alpha_composite(overlay, (x, y))
+    return canvas
+
+
+def _normalise_format(fmt):
+    fmt = (fmt or 'PNG').upper()
+    return 'JPEG' if fmt == 'JPG' else fmt
+
+
+def encode(image, fmt='PNG', quality=None, optimize=False):
+    """Encode an image to bytes (``quality`` applies to JPEG/WebP)"""
+    fmt = _normalise_format(fmt)
+    options = {}
+    if fmt == 'PNG':
+        # optimize is much slower, so it is only used when chasing a size target
+        options['optimize'] = optimize
+        if image.mode == 'RGBA' and image.getchannel('A').getextrema() == (255, 255):
+            image = image.convert('RGB')  # fully opaque: the alpha channel is dead weight
+    elif fmt in ('JPEG', 'WEBP'):
+        options['quality'] = quality or MOCKUP_QUALITY
+        if fmt == 'JPEG':
+            options.update(optimize=True, progressive=True)
+            if image.mode not in ('RGB', 'L'):
+                # JPEG has no alpha: flatten onto white like a browser would
+                background = Image.new('RGB', image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel('A') if 'A' in image.getbands() else None)
+                image = background
+        else:
+            options['method'] = 4
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, **options)
+    return buffer.getvalue()
+
+
+def encode_mockup(image, fmt=None, quality=None, max_dimension=None, target_bytes=None,
+                  min_quality=MIN_QUALITY):
+    """Encode a mockup with the configured settings.
+
+    Returns (data, settings) where ``settings`` records the format,
+    quality, dimensions and resulting size. With ``target_bytes``, JPEG and
+    WebP use the highest quality in [min_quality, quality] that fits (or
+    min_quality if nothing does); a PNG over the target is retried as a
+    256-color palette image.
+    """
+    fmt = _normalise_format(fmt or MOCKUP_FORMAT)
+    quality = quality or MOCKUP_QUALITY
+    max_dimension = max_dimension or MOCKUP_MAX_DIMENSION
+    target_bytes = target_bytes or MOCKUP_TARGET_BYTES
+
+    if max_dimension and max(image.size) > max_dimension:
+        image = image.copy()
+        image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+
+    settings = {"format": fmt, "width": image.width, "height": image.height}
+    if fmt == 'PNG':
+        data = encode(image, fmt)
+        if target_bytes and len(data) > target_bytes:
+            data = encode(image.quantize(256, method=Image.Quantize.FASTOCTREE), fmt, optimize=True)
+            settings["palette"] = True
+    elif not target_bytes:
+        data = encode(image, fmt, quality)
+        settings["quality"] = quality
+    else:
+        # Binary search for the highest quality that fits the byte target
+        data = encode(image, fmt, quality)
+        best_quality = quality
+        if len(data) > target_bytes:
+            best = None
+            low, high = min_quality, quality - 1
+            while low <= high:
+                mid = (low + high) // 2
+                candidate = encode(image, fmt, mid)
+                if len(candidate) <= target_bytes:
+                    best, best_quality = candidate, mid
+                    low = mid + 1
+                else:
+                    high = mid - 1
+            if best is None:
+                best, best_quality = encode(image, fmt, min_quality), min_quality
+            data = best
+        settings["quality"] = best_quality
+    if target_bytes:
+        settings["target_bytes"] = target_bytes
+        settings["target_met"] = len(data) <= target_bytes
+    settings["bytes"] = len(data)
+    return data, settings
+
+
+def render_mockup(product_image, template=DEFAULT_TEMPLATE, fmt=None, **encode_options):
+    """Composite a mockup and return the encoded image bytes"""
+    data, _ = encode_mockup(composite(product_image, template), fmt, **encode_options)
+    return data
+
+
+def encoding_config():
+    """The configured placement and encoding settings (for stage caching)"""
+    return {"scale": PRODUCT_SCALE, "format": MOCKUP_FORMAT, "quality": MOCKUP_QUALITY,
+            "max_dimension": MOCKUP_MAX_DIMENSION, "target_bytes": MOCKUP_TARGET_BYTES}
+
+
+def output_path_for(output_path, fmt=None):
+    """``output_path`` with the extension of the output format"""
+    root, _ = os.path.splitext(output_path)
+    return root + EXTENSIONS.get(_normalise_format(fmt or MOCKUP_FORMAT), '.png')
+
+
+def create_mockup(product_image_path=DEFAULT_PRODUCT_IMAGE, output_path=DEFAULT_OUTPUT,
+                  template_path=DEFAULT_TEMPLATE, **encode_options):
+    """Write the mockup and its mockup.json (the Node script's fields plus encoding); returns the metadata.
+
+    ``encode_options`` are passed to encode_mockup; the file extension
+    follows the output format.
+    """
+    product_image_path = os.path.abspath(product_image_path)
+    template_path = os.path.abspath(template_path)
+    mockup = composite(product_image_path, template_path)
+    data, settings = encode_mockup(mockup, **encode_options)
+    output_path = output_path_for(os.path.abspath(output_path), settings['format'])
+    with open(output_path, 'wb') as f:
+        f.write(data)
+    metadata = {
+        "mockup_url": output_path,
+        "width": settings['width'],
+        "height": settings['height'],
+        "product_image": product_image_path,
+        "template": template_path,
+        "encoding": settings
+    }
+    with open(os.path.join(os.path.dirname(output_path), 'mockup.json'), 'w') as f:
+        json.dump(metadata, f, indent=2)
+    print('Mockup created:', metadata)
+    return metadata
+
+
+if __name__ == "__main__":
+    create_mockup(*sys.argv[1:4])
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Merch Maker Lite - Batch Mockup Rendering
+=========================================
+
+Renders every design onto every template (colors, garment types, ...)
+across a process pool. Each template is decoded once in the parent and
+placed in shared memory; workers composite against zero-copy views of
+those pixels instead of decoding the templates themselves.
+
+Every rendered image reports its compositing/encoding time, and the
+results are written to ``<output-dir>/mockups.jsonl``.
+
+Usage:
+    python mockup_batch.py batch_output/*.png --templates templates/ --output-dir mockups
+    python mockup_batch.py design.png --templates ../js/template.png --workers 4
+"""
+
+import os
+import glob
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+from PIL import Image
+
+import mockup
+from metrics import percentile
+
+# Worker-side shared templates: name -> (SharedMemory, Image view)
+_worker_templates = {}
+
+
+def unique_names(paths):
+    """Map each distinct path to a unique name for its outputs.
+
+    Names are the file stem (``tee`` for ``a/tee.png``); paths whose stems
+    collide are named by their path relative to the common directory
+    instead (``a__tee`` and ``b__tee``), plus the extension if that still
+    collides (``a__tee_png``).
+    """
+    paths = list(dict.fromkeys(os.path.abspath(path) for path in paths))
+    stems = [os.path.splitext(os.path.basename(path))[0] for path in paths]
+    if len(set(stems)) == len(stems):
+        return dict(zip(paths, stems))
+    base = os.path.commonpath([os.path.dirname(path) for path in paths])
+    roots = [os.path.splitext(os.path.relpath(path, base)) for path in paths]
+    names = [root.replace(os.sep, '__') for root, _ in roots]
+    return {
+        path: stem if stems.count(stem) == 1
+        else name if names.count(name) == 1
+        else name + ext.replace('.', '_')
+        for path, stem, name, (_, ext) in zip(paths, stems, names, roots)
+    }
+
+
+class SharedTemplates:
+    """Decoded templates published in shared memory for worker processes"""
+
+    def __init__(self, template_paths):
+        self.descriptors = {}
+        self._segments = []
+        try:
+            for path, name in unique_names(template_paths).items():
+                image = mockup.load_template(path)
+                data = image.tobytes()
+                segment = shared_memory.SharedMemory(create=True, size=len(data))
+                self._segments.append(segment)
+                segment.buf[:len(data)] = data
+                self.descriptors[name] = (segment.name, image.size)
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        for segment in self._segments:
+            segment.close()
+            segment.unlink()
+        self._segments = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _init_worker(descriptors):
+    for name, (segment_name, size) in descriptors.items():
+        segment = shared_memory.SharedMemory(name=segment_name)
+        view = Image.frombuffer('RGBA', size, segment.buf, 'raw', 'RGBA', 0, 1)
+        _worker_templates[name] = (segment, view)
+
+
+def _render(design_path, template_name, output_path, encode_options):
+    """Render one design x template pair in a worker"""
+    started = time.perf_counter()
+    template = _worker_templates[template_name][1]
+    image = mockup.composite(design_path, template)
+    composited = time.perf_counter()
+    data, settings = mockup.encode_mockup(image, **encode_options)
+    encoded = time.perf_counter()
+    with open(output_path, 'wb') as f:
+        f.write(data)
+    return {
+        "design": design_path,
+        "template": template_name,
+        "output": output_path,
+        "bytes": len(data),
+        "encoding": settings,
+        "composite_ms": round((composited - started) * 1000, 1),
+        "encode_ms": round((encoded - composited) * 1000, 1),
+        "total_ms": round((time.perf_counter() - started) * 1000, 1),
+        "pid": os.getpid(),
+    }
+
+
+def render_matrix(design_paths, template_paths, output_dir="mockups", workers=None, **encode_options):
+    """Render every design onto every template; yields a result per image as it finishes.
+
+    Outputs go to ``<output_dir>/<design>/<template>.<ext>``, named by
+    unique_names() so designs or templates sharing a file name don't
+    overwrite each other. Failed renders
+    yield a result with an ``error`` instead of raising. ``encode_options``
+    are passed to mockup.encode_mockup.
+    """
+    with SharedTemplates(template_paths) as templates, ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(templates.descriptors,)) as pool:
+        futures = {}
+        for design_path, design_name in unique_names(design_paths).items():
+            design_dir = os.path.join(output_dir, design_name)
+            os.makedirs(design_dir, exist_ok=True)
+            for template_name in templates.descriptors:
+                output_path = mockup.output_path_for(os.path.join(design_dir, template_name),
+                                                     encode_options.get('fmt'))
+                future = pool.submit(_render, design_path, template_name, output_path, encode_options)
+                futures[future] = (design_path, template_name)
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                design_path, template_name = futures[future]
+                yield {"design": design_path, "template": template_name, "error": str(e)}
+
+
+def _expand(paths, patterns=('*.png', '*.jpg', '*.jpeg', '*.webp')):
+    expanded = []
+    for path in paths:
+        if os.path.isdir(path):
+            for pattern in patterns:
+                expanded.extend(sorted(glob.glob(os.path.join(path, pattern))))
+        else:
+            expanded.extend(sorted(glob.glob(path)) or [path])
+    return expanded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render designs onto a set of mockup templates")
+    parser.add_argument("designs", nargs="+", help="design images or directories")
+    parser.add_argument("--templates", nargs="+", default=[str(mockup.DEFAULT_TEMPLATE)],
+                        help="template images or directories")
+    parser.add_argument("--output-dir", default="mockups")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--format", choices=["PNG", "JPEG", "WEBP"], type=str.upper,
+                        help="output format (default: MOCKUP_FORMAT or PNG)")
+    parser.add_argument("--quality", type=int, help="JPEG/WebP quality")
+    parser.add_argument("--max-dimension", type=int, help="downscale so the longest side fits")
+    parser.add_argument("--target-kb", type=float, help="search for the best quality under this size")
+    args = parser.parse_args(argv)
+
+    # The same file listed twice is rendered once
+    designs = list(unique_names(_expand(args.designs)))
+    templates = list(unique_names(_expand(args.templates)))
+    total = len(designs) * len(templates)
+    print(f"🎨 Rendering {len(designs)} designs x {len(templates)} templates on {args.workers} workers...")
+
+    encode_options = {"fmt": args.format, "quality": args.quality, "max_dimension": args.max_dimension,
+                      "target_bytes": int(args.target_kb * 1024) if args.target_kb else None}
+    os.makedirs(args.output_dir, exist_ok=True)
+    started = time.perf_counter()
+    timings = []
+    failed = 0
+    with open(os.path.join(args.output_dir, 'mockups.jsonl'), 'w', encoding='utf-8') as f:
+        for done, result in enumerate(render_matrix(designs, templates, args.output_dir, args.workers,
+                                                    **encode_options), 1):
+            f.write(json.dumps(result) + "\n")
+            if 'error' in result:
+                failed += 1
+                print(f"[{done}/{total}] ❌ {result['design']} x {result['template']}: {result['error']}")
+                continue
+            timings.append(result['total_ms'])
+            print(f"[{done}/{total}] {result['output']} ({result['composite_ms']} ms composite, "
+                  f"{result['encode_ms']} ms encode, {result['bytes'] // 1024} KB)")
+
+    elapsed = time.perf_counter() - started
+    print(f"✅ {len(timings)}/{total} mockups in {elapsed:.1f}s ({len(timings) / elapsed:.1f}/s)")
+    if timings:
+        timings.sort()
+        print(f"⏱️ Per image: p50 {percentile(timings, 50):.0f} ms, p95 {percentile(timings, 95):.0f} ms")
+    if failed or len(timings) < total:
+        print(f"❌ {total - len(timings)} mockups were not rendered")
+    return failed == 0 and len(timings) == total
+
+
+if __name__ == "__main__":
+    main()
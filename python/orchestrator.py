@@ -1,8 +1,12 @@
 import os
-import subprocess
 import requests
 import json
+import argparse
 from pathlib import Path
+from artifacts import RunArtifacts
+from metrics import export, metrics, report
+from pipeline import Pipeline, GeneratedProduct, Mockup, FALLBACK_PRODUCT
+from stage_cache import STAGES, hash_inputs
 
 # Paths
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -10,69 +14,87 @@ PYTHON_DIR = BASE_DIR / 'python'
 JS_DIR = BASE_DIR / 'js'
 PHP_ENDPOINT = 'http://localhost:8000/publisher.php'
 
-# 1. Generate product content and image
-print('Running product generator...')
-gen_proc = subprocess.run([
-    'python', str(PYTHON_DIR / 'product_generator.py')
-], cwd=PYTHON_DIR, capture_output=True, text=True)
-print(gen_proc.stdout)
+def run_pipeline(pipeline=None, force=(), run=None):
+    """Run the simulation pipeline in this process.
 
-# 2. Generate mockup visual
-print('Running mockup visualizer...')
-mockup_proc = subprocess.run([
-    'node', str(JS_DIR / 'mockup_visualizer.js')
-], cwd=JS_DIR, capture_output=True, text=True)
-print(mockup_proc.stdout)
+    ``force`` lists stages to rerun even if their inputs are unchanged.
+    Files are written to the ``run`` artifact directory (a new one by default).
+    """
+    pipeline = pipeline or Pipeline(force=force)
+    run = run or RunArtifacts()
+    with metrics.scope() as run_metrics:  # this run's metrics only
+        return _run_pipeline(pipeline, run, run_metrics)
 
-# 3. Collect product data
-product_json_path = PYTHON_DIR / 'product.json'
-if not product_json_path.exists():
-    print('⚠️ product.json not found, creating fallback data...')
-    product_data = {
-        "title": "AI Generated T-Shirt",
-        "description": "A unique AI-generated t-shirt design",
-        "tags": ["ai-generated", "creative", "modern"],
-        "keywords": ["ai-generated", "creative", "modern", "design", "fashion"]
-    }
-    with open(product_json_path, 'w') as f:
-        json.dump(product_data, f, indent=2)
-    print('✅ Created fallback product.json')
-else:
-    with open(product_json_path, 'r') as f:
-        product_data = json.load(f)
+def _run_pipeline(pipeline, run, run_metrics):
+    print(f'Run {run.run_id}: artifacts in {run.dir}')
 
-# Load mockup data
-mockup_json_path = JS_DIR / 'mockup.json'
-if mockup_json_path.exists():
-    with open(mockup_json_path, 'r') as f:
-        mockup_data = json.load(f)
-else:
-    print('⚠️ mockup.json not found, creating fallback data...')
-    mockup_data = {
-        "mockup_url": str(JS_DIR / "mockup.png"),
-        "width": 2500,
-        "height": 2500,
-        "product_image": str(PYTHON_DIR / "generated_image.png"),
-        "template": str(JS_DIR / "template.png")
-    }
+    # 1. Generate product content and image
+    print('Running product generator...')
+    try:
+        with metrics.timer('merch_stage_seconds', stage='generate'):
+            generated = pipeline.generate(run=run)
+    except Exception as e:
+        # The simulation works offline: carry on with the fallback product
+        print(f'⚠️ Product generation failed: {e}')
+        generated = GeneratedProduct(product=None, image_path=run.path('generated_image.png'))
 
-# Merge data
-product_payload = {
-    **product_data,
-    'mockup': mockup_data
-}
+    # 2. Generate mockup visual
+    print('Running mockup visualizer...')
+    try:
+        with metrics.timer('merch_stage_seconds', stage='mockup'):
+            mockup = pipeline.mockup(generated, run=run)
+    except Exception as e:
+        print(f'⚠️ {e}')
+        print('⚠️ mockup.json not found, creating fallback data...')
+        mockup = Mockup(path=run.path('mockup.png'), metadata={
+            "mockup_url": str(run.path("mockup.png")),
+            "width": 2500,
+            "height": 2500,
+            "product_image": str(generated.image_path),
+            "template": str(JS_DIR / "template.png")
+        })
 
-# 4. Publish to PHP endpoint
-print('Publishing to PHP endpoint...')
-try:
-    resp = requests.post(PHP_ENDPOINT, json=product_payload)
-    print('Response:', resp.text)
-except Exception as e:
-    print('Failed to POST to PHP endpoint:', e)
+    # 3. Collect product data
+    if generated.product is None:
+        print('⚠️ product.json not valid, creating fallback data...')
+        generated.product = dict(FALLBACK_PRODUCT)
+        run.write_json('product.json', generated.product)
+        print('✅ Created fallback product.json')
 
-# 5. Save the final payload
-samples_dir = BASE_DIR / 'samples'
-samples_dir.mkdir(exist_ok=True)
-with open(samples_dir / 'final_product_payload.json', 'w') as f:
-    json.dump(product_payload, f, indent=2)
-print('Pipeline complete. All data saved.') 
\ No newline at end of file
+    # Merge data
+    product_payload = pipeline.collect(generated, mockup)
+
+    # 4. Publish to PHP endpoint (unless this payload was already published,
+    # or the local catalog mirror already has it)
+    publish_key = hash_inputs(PHP_ENDPOINT, product_payload)
+    existing = None if 'publish' in pipeline.stages.force else pipeline.catalog.find_existing(product_payload)
+    if pipeline.stages.get('publish', publish_key):
+        pass
+    elif existing:
+        print(f"⚠️ '{existing.get('title')}' already exists in the catalog mirror (ID: {existing.get('id')}), skipping publish")
+    else:
+        print('Publishing to PHP endpoint...')
+        try:
+            with metrics.timer('merch_stage_seconds', stage='publish'):
+                resp = requests.post(PHP_ENDPOINT, json=product_payload)
+            print('Response:', resp.text)
+            if resp.ok:
+                pipeline.stages.put('publish', publish_key, {'response': resp.text})
+        except Exception as e:
+            print('Failed to POST to PHP endpoint:', e)
+
+    # 5. Save the final payload (in the run, and as the latest sample)
+    run.write_json('final_product_payload.json', product_payload)
+    run.publish_sample('final_product_payload.json')
+    export(run, run_metrics)
+    print(f'📈 Metrics (saved to {run.path("metrics.json")}):\n{report(run_metrics)}')
+    print(f'Pipeline complete. All data saved in {run.dir}')
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the simulation pipeline")
+    parser.add_argument("--force", action="append", default=[], choices=[*STAGES, 'all'],
+                        help="rerun a stage even if its inputs are unchanged (repeatable)")
+    parser.add_argument("--run-id", help="artifact directory to (re)use under runs/ (default: a new run)")
+    args = parser.parse_args()
+    run_pipeline(force=args.force, run=RunArtifacts(args.run_id))
@@ -1,118 +1,141 @@
-import os
-import subprocess
 import json
+import argparse
 from pathlib import Path
-from shopify_integration import ShopifyIntegration
+from artifacts import RunArtifacts
+from dag import StageGraph, StageError
+from metrics import export, metrics, report
+from pipeline import Pipeline
+from stage_cache import STAGES
 
 # Paths
 BASE_DIR = Path(__file__).resolve().parent.parent
 PYTHON_DIR = BASE_DIR / 'python'
 JS_DIR = BASE_DIR / 'js'
 
-def run_pipeline_with_shopify():
-    """Run the complete pipeline with Shopify integration"""
+def run_pipeline_with_shopify(pipeline=None, run=None):
+    """Run the complete pipeline with Shopify integration.
+    
+    Stages run as a dependency graph: the catalog sync and template
+    decoding overlap generation, and the duplicate check overlaps the
+    mockup render. The product is created once the mockup is ready, with
+    the mockup attached in the same request, so a failed render never
+    leaves an orphan draft. Files are written to the ``run`` artifact
+    directory (a new one by default).
+    """
+    pipeline = pipeline or Pipeline()
+    run = run or RunArtifacts()
+    with metrics.scope() as run_metrics:  # this run's metrics only
+        return _run_pipeline_with_shopify(pipeline, run, run_metrics)
+
+def _run_pipeline_with_shopify(pipeline, run, run_metrics):
+    shopify = pipeline.shopify
     
     print("🚀 Starting Merch Maker Lite Pipeline with Shopify Integration")
     print("=" * 60)
+    print(f"📂 Run {run.run_id}: artifacts in {run.dir}")
     
-    # 1. Generate product content and image
-    print('\n📝 Step 1: Generating product content and image...')
-    gen_proc = subprocess.run([
-        'python', str(PYTHON_DIR / 'product_generator.py')
-    ], cwd=PYTHON_DIR, capture_output=True, text=True)
-    print(gen_proc.stdout)
+    def generate():
+        print('\n📝 Generating product content and image...')
+        return pipeline.generate(run=run)
     
-    if gen_proc.returncode != 0:
-        print(f"❌ Product generation failed: {gen_proc.stderr}")
-        return False
+    def mockup(generate, template):
+        print('\n🎨 Creating professional mockup...')
+        return pipeline.mockup(generate, run=run)
     
-    # 2. Generate mockup visual
-    print('\n🎨 Step 2: Creating professional mockup...')
-    mockup_proc = subprocess.run([
-        'node', str(JS_DIR / 'mockup_visualizer.js')
-    ], cwd=JS_DIR, capture_output=True, text=True)
-    print(mockup_proc.stdout)
+    def collect(generate, mockup):
+        product_payload = pipeline.collect(generate, mockup)
+        print(f"✅ Product data collected: {product_payload.get('title', 'Unknown')}")
+        return product_payload
     
-    if mockup_proc.returncode != 0:
-        print(f"❌ Mockup generation failed: {mockup_proc.stderr}")
-        return False
+    def existing(generate, catalog_sync):
+        if generate.product is None:
+            raise ValueError("Product generator did not return valid product JSON")
+        if 'upload' in pipeline.stages.force:
+            return None  # a forced upload creates a new product even if one matches
+        return pipeline.find_existing(generate.product, sync=False)
+    
+    def create_product(generate, existing, mockup):
+        # Reuse the product created from this exact data and mockup on an earlier run
+        upload = pipeline.cached_upload(generate.product, mockup)
+        if upload or existing:
+            return upload
+        print('\n🛍️ Creating draft product in Shopify (with its mockup)...')
+        upload = pipeline.upload(generate.product, mockup)
+        if not upload:
+            raise RuntimeError("Failed to upload product to Shopify")
+        return upload
+    
+    graph = StageGraph()
+    graph.add('catalog_sync', pipeline.sync_catalog)
+    graph.add('template', pipeline.warm_template)
+    graph.add('generate', generate)
+    graph.add('mockup', mockup, deps=('generate', 'template'))
+    graph.add('collect', collect, deps=('generate', 'mockup'))
+    graph.add('existing', existing, deps=('generate', 'catalog_sync'))
+    graph.add('create_product', create_product, deps=('generate', 'existing', 'mockup'))
     
-    # 3. Collect product data
-    print('\n📊 Step 3: Collecting product data...')
     try:
-        with open(PYTHON_DIR / 'product.json', 'r') as f:
-            product_data = json.load(f)
-        with open(JS_DIR / 'mockup.json', 'r') as f:
-            mockup_data = json.load(f)
-        
-        # Merge data
-        product_payload = {
-            **product_data,
-            'mockup': mockup_data
-        }
-        
-        print(f"✅ Product data collected: {product_data.get('title', 'Unknown')}")
-        
-    except Exception as e:
-        print(f"❌ Failed to collect product data: {e}")
+        results = graph.run()
+    except StageError as e:
+        print(f"❌ {e.stage} failed: {e.error}")
+        print(f"\n⏱️ Stage timings:\n{graph.report()}")
+        export(run, run_metrics)
+        return False
+    print(f"\n⏱️ Stage timings:\n{graph.report()}")
+    export(run, run_metrics)
+    print(f"\n📈 Metrics (saved to {run.path('metrics.json')}):\n{report(run_metrics)}")
+    
+    upload = results['create_product']
+    if upload is None:
+        existing_product = results['existing']
+        print(f"⚠️ A product titled '{existing_product.get('title')}' already exists (ID: {existing_product.get('id')}), skipping creation")
         return False
+    if not upload.product.get('images'):
+        print("⚠️ Product created, but the mockup image could not be attached")
     
-    # 4. Upload to Shopify
-    print('\n🛍️ Step 4: Uploading to Shopify...')
     try:
-        shopify = ShopifyIntegration()
+        shopify_product = upload.product
+        print(f"✅ Product uploaded to Shopify successfully!")
+        print(f"   Product ID: {shopify_product.get('id')}")
+        print(f"   Title: {shopify_product.get('title')}")
+        print(f"   Status: {shopify_product.get('status')}")
         
-        # Get mockup path
-        mockup_path = JS_DIR / 'mockup.png'
+        # Optionally publish the product
+        publish_choice = input("\n🤔 Would you like to publish this product? (y/n): ").lower()
+        if publish_choice == 'y':
+            if shopify.publish_product(shopify_product['id']):
+                print("✅ Product published and now live on Shopify!")
+            else:
+                print("⚠️ Product created but not published (still in draft mode)")
         
-        # Create product in Shopify
-        shopify_product = shopify.create_product(product_data, str(mockup_path))
-        
-        if shopify_product:
-            print(f"✅ Product uploaded to Shopify successfully!")
-            print(f"   Product ID: {shopify_product.get('id')}")
-            print(f"   Title: {shopify_product.get('title')}")
-            print(f"   Status: {shopify_product.get('status')}")
-            
-            # Optionally publish the product
-            publish_choice = input("\n🤔 Would you like to publish this product? (y/n): ").lower()
-            if publish_choice == 'y':
-                if shopify.publish_product(shopify_product['id']):
-                    print("✅ Product published and now live on Shopify!")
-                else:
-                    print("⚠️ Product created but not published (still in draft mode)")
-            
-            # Save the final payload with Shopify info
-            final_payload = {
-                **product_payload,
-                'shopify': {
-                    'product_id': shopify_product.get('id'),
-                    'status': shopify_product.get('status'),
-                    'admin_url': f"https://{shopify.shop_url}/admin/products/{shopify_product.get('id')}"
-                }
+        # Save the final payload with Shopify info
+        final_payload = {
+            **results['collect'],
+            'shopify': {
+                'product_id': shopify_product.get('id'),
+                'status': shopify_product.get('status'),
+                'admin_url': upload.admin_url
             }
-            
-            # Save to samples directory
-            with open(BASE_DIR / 'samples' / 'shopify_product_payload.json', 'w') as f:
-                json.dump(final_payload, f, indent=2)
-            
-            print(f"\n📁 Final payload saved to: samples/shopify_product_payload.json")
-            print(f"🔗 View product in Shopify admin: {final_payload['shopify']['admin_url']}")
-            
-            return True
-        else:
-            print("❌ Failed to upload product to Shopify")
-            return False
-            
+        }
+        
+        # Save in the run, and as the latest sample
+        run.write_json('shopify_product_payload.json', final_payload)
+        run.publish_sample('shopify_product_payload.json')
+        
+        print(f"\n📁 Final payload saved to: {run.path('shopify_product_payload.json')}")
+        print(f"🔗 View product in Shopify admin: {final_payload['shopify']['admin_url']}")
+        
+        return True
     except Exception as e:
         print(f"❌ Shopify integration failed: {e}")
         return False
 
-def test_shopify_connection():
+def test_shopify_connection(pipeline=None):
     """Test the Shopify connection before running the pipeline"""
+    pipeline = pipeline or Pipeline()
     print("🔍 Testing Shopify connection...")
     try:
-        shopify = ShopifyIntegration()
+        shopify = pipeline.shopify
         products = shopify.get_products(limit=1)
         print(f"✅ Shopify connection successful!")
         print(f"   Store: {shopify.shop_url}")
@@ -125,20 +148,39 @@ def test_shopify_connection():
         print("   SHOPIFY_ACCESS_TOKEN=your-access-token")
         return False
 
-if __name__ == "__main__":
+def main(force=(), run_id=None):
+    """Test the connection, then run the pipeline in this process.
+    
+    ``force`` lists stages to rerun even if their inputs are unchanged;
+    ``run_id`` reuses an existing run's artifact directory.
+    """
     print("Merch Maker Lite - Shopify Integration")
     print("=" * 40)
     
+    pipeline = Pipeline(force=force)
+    
     # Test connection first
-    if test_shopify_connection():
+    if test_shopify_connection(pipeline):
         print("\n🚀 Starting pipeline...")
-        success = run_pipeline_with_shopify()
+        success = run_pipeline_with_shopify(pipeline, RunArtifacts(run_id))
         
         if success:
             print("\n🎉 Pipeline completed successfully!")
             print("Your AI-generated product is now live on Shopify!")
         else:
             print("\n❌ Pipeline failed. Please check the errors above.")
+        return success
     else:
         print("\n❌ Cannot proceed without Shopify connection.")
-        print("Please set up your Shopify credentials and try again.") 
\ No newline at end of file
+        print("Please set up your Shopify credentials and try again.")
+        return False
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the pipeline with Shopify integration")
+    # This pipeline publishes interactively, so there is no cached publish stage to force
+    parser.add_argument("--force", action="append", default=[],
+                        choices=[*(stage for stage in STAGES if stage != 'publish'), 'all'],
+                        help="rerun a stage even if its inputs are unchanged (repeatable)")
+    parser.add_argument("--run-id", help="artifact directory to (re)use under runs/ (default: a new run)")
+    args = parser.parse_args()
+    main(force=args.force, run_id=args.run_id) 
\ No newline at end of file
@@ -0,0 +1,255 @@
+"""
+Merch Maker Lite - In-Process Pipeline
+======================================
+
+Runs the product generator, the mockup step and the Shopify upload as
+callable stages inside one long-lived Python process. Stages exchange
+typed results in memory instead of re-launching interpreters and
+re-reading product.json between steps; the JSON/PNG artifacts are still
+written so the other tools (and humans) can inspect them.
+
+Pipeline stages are cached on a content hash of their inputs (see
+stage_cache.py); ``force`` reruns the named stages regardless.
+
+Pass a ``run`` (artifacts.RunArtifacts) to the stage methods to keep a
+run's files in its own directory, so pipelines can run concurrently.
+"""
+
+import os
+import json
+import time
+import threading
+import subprocess
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+import product_generator
+from artifacts import RunArtifacts
+from catalog_mirror import CatalogMirror
+from dedup import DedupIndex
+from shopify_integration import ShopifyIntegration
+from stage_cache import StageCache, hash_inputs
+
+try:
+    import mockup as mockup_renderer
+except ImportError:  # Pillow not installed: fall back to the Node visualizer
+    mockup_renderer = None
+
+# Paths
+BASE_DIR = Path(__file__).resolve().parent.parent
+PYTHON_DIR = BASE_DIR / 'python'
+JS_DIR = BASE_DIR / 'js'
+
+FALLBACK_PRODUCT = {
+    "title": "AI Generated T-Shirt",
+    "description": "A unique AI-generated t-shirt design",
+    "tags": ["ai-generated", "creative", "modern"],
+    "keywords": ["ai-generated", "creative", "modern", "design", "fashion"]
+}
+
+
+@dataclass
+class GeneratedProduct:
+    """Output of the generation stage"""
+    product: Optional[dict]
+    image_path: Path
+
+
+@dataclass
+class Mockup:
+    """Output of the mockup stage"""
+    path: Path
+    metadata: dict = field(default_factory=dict)
+
+
+@dataclass
+class ShopifyUpload:
+    """Output of the Shopify stage"""
+    product: dict
+    admin_url: str
+
+
+# --- Stages ---
+def generate_stage(image_path=PYTHON_DIR / 'generated_image.png',
+                   product_path=PYTHON_DIR / 'product.json',
+                   use_cache=True,
+                   dedup_index: Optional[DedupIndex] = None,
+                   variant=0) -> GeneratedProduct:
+    """Generate product content and image, skipping near-duplicate ideas"""
+    product, image_path = product_generator.generate_product(str(image_path), str(product_path), use_cache,
+                                                             dedup_index, variant=variant)
+    return GeneratedProduct(product=product, image_path=Path(image_path))
+
+
+def _use_pillow():
+    return mockup_renderer is not None and os.getenv('MOCKUP_RENDERER', 'pillow') != 'node'
+
+
+def mockup_stage(generated: GeneratedProduct,
+                 output_path=JS_DIR / 'mockup.png',
+                 template_path=JS_DIR / 'template.png') -> Mockup:
+    """Render the mockup for a generated product image.
+
+    Uses the in-process Pillow compositor when available (or unless
+    MOCKUP_RENDERER=node), otherwise js/mockup_visualizer.js.
+    """
+    output_path = Path(output_path)
+    if _use_pillow():
+        metadata = mockup_renderer.create_mockup(generated.image_path, output_path, template_path)
+        return Mockup(path=Path(metadata['mockup_url']), metadata=metadata)
+
+    proc = subprocess.run([
+        'node', str(JS_DIR / 'mockup_visualizer.js'),
+        str(generated.image_path), str(output_path), str(template_path)
+    ], cwd=JS_DIR, capture_output=True, text=True)
+    print(proc.stdout)
+    if proc.returncode != 0:
+        raise RuntimeError(f"Mockup generation failed: {proc.stderr}")
+
+    with open(output_path.parent / 'mockup.json', 'r') as f:
+        metadata = json.load(f)
+    return Mockup(path=output_path, metadata=metadata)
+
+
+def collect_stage(generated: GeneratedProduct, mockup: Mockup) -> dict:
+    """Merge product data and mockup metadata into the final payload"""
+    if generated.product is None:
+        raise ValueError("Product generator did not return valid product JSON")
+    return {
+        **generated.product,
+        'mockup': mockup.metadata
+    }
+
+
+def shopify_stage(product_data: dict, mockup: Optional[Mockup],
+                  shopify: ShopifyIntegration) -> Optional[ShopifyUpload]:
+    """Create the product (and its mockup image) in Shopify"""
+    mockup_path = str(mockup.path) if mockup else None
+    shopify_product = shopify.create_product(product_data, mockup_path)
+    if not shopify_product:
+        return None
+    admin_url = f"https://{shopify.shop_url}/admin/products/{shopify_product.get('id')}"
+    return ShopifyUpload(product=shopify_product, admin_url=admin_url)
+
+
+class Pipeline:
+    """Long-lived pipeline runner that keeps clients warm between products"""
+
+    def __init__(self, shopify=None, catalog=None, dedup=None, stages=None, force=()):
+        self._shopify = shopify
+        self._catalog = catalog
+        self._dedup = dedup
+        self.stages = stages or StageCache(force=force)
+        self._sync_lock = threading.Lock()
+        self._synced_at = None
+
+    @property
+    def shopify(self):
+        if self._shopify is None:
+            self._shopify = ShopifyIntegration.shared()
+        return self._shopify
+
+    @property
+    def catalog(self):
+        if self._catalog is None:
+            self._catalog = CatalogMirror()
+        return self._catalog
+
+    @property
+    def dedup(self):
+        if self._dedup is None:
+            self._dedup = DedupIndex()
+        return self._dedup
+
+    def sync_catalog(self, max_age=0.0):
+        """Sync the catalog mirror from the store, unless that was done in the last ``max_age`` seconds.
+
+        Threads sharing the pipeline wait for a sync in progress instead of starting their own.
+        """
+        with self._sync_lock:
+            if self._synced_at is None or time.monotonic() - self._synced_at >= max_age:
+                self.catalog.sync(self.shopify)
+                self._synced_at = time.monotonic()
+
+    def find_existing(self, product_data: dict, sync=True) -> Optional[dict]:
+        """Look the product up in the local catalog mirror, syncing it from the store first"""
+        if sync:
+            self.sync_catalog()
+        return self.catalog.find_existing(product_data)
+
+    def generate(self, run: Optional[RunArtifacts] = None, **kwargs) -> GeneratedProduct:
+        kwargs.setdefault('dedup_index', self.dedup)
+        if run:
+            kwargs.setdefault('image_path', run.path('generated_image.png'))
+            kwargs.setdefault('product_path', run.path('product.json'))
+        if not kwargs.get('use_cache', True) or run is None:
+            return generate_stage(**kwargs)  # a fresh creative run bypasses every cache
+
+        # Generation is creative: only a resumed or retried run reuses its own output
+        variant = kwargs.get('variant', 0)
+        key = hash_inputs(product_generator.generation_inputs(), run.run_id, *([variant] if variant else []))
+        cached = self.stages.get('generate', key)
+        if cached:
+            image_path = run.import_file(Path(cached['image_path']), 'generated_image.png')
+            run.write_json('product.json', cached['product'])
+            return GeneratedProduct(product=cached['product'], image_path=image_path)
+        generated = generate_stage(**kwargs)
+        if generated.product is not None:
+            self.stages.put('generate', key, {'product': generated.product, 'image_path': generated.image_path},
+                            files=[generated.image_path])
+        return generated
+
+    def mockup(self, generated: GeneratedProduct, run: Optional[RunArtifacts] = None, **kwargs) -> Mockup:
+        if run:
+            kwargs.setdefault('output_path', run.path('mockup.png'))
+        template_path = Path(kwargs.get('template_path', JS_DIR / 'template.png'))
+        config = {'renderer': 'pillow', **mockup_renderer.encoding_config()} if _use_pillow() else {'renderer': 'node'}
+        key = hash_inputs(Path(generated.image_path), template_path, config)
+        cached = self.stages.get('mockup', key)
+        if cached:
+            path, metadata = Path(cached['path']), cached['metadata']
+            if run:
+                path = run.import_file(path, path.name)
+                metadata = {**metadata, 'mockup_url': str(path), 'product_image': str(generated.image_path)}
+                run.write_json('mockup.json', metadata)
+            return Mockup(path=path, metadata=metadata)
+        mockup = mockup_stage(generated, **kwargs)
+        self.stages.put('mockup', key, {'path': mockup.path, 'metadata': mockup.metadata}, files=[mockup.path])
+        return mockup
+
+    def collect(self, generated: GeneratedProduct, mockup: Mockup) -> dict:
+        return collect_stage(generated, mockup)
+
+    def _upload_key(self, product_data: dict, mockup: Optional[Mockup]):
+        return hash_inputs(self.shopify.shop_url, product_data, Path(mockup.path) if mockup else None)
+
+    def cached_upload(self, product_data: dict, mockup: Optional[Mockup]) -> Optional[ShopifyUpload]:
+        """The upload of an identical product + mockup made earlier, if any"""
+        cached = self.stages.get('upload', self._upload_key(product_data, mockup))
+        return ShopifyUpload(**cached) if cached else None
+
+    def warm_template(self, template_path=JS_DIR / 'template.png'):
+        """Decode the mockup template ahead of time (no-op for the Node renderer)"""
+        if _use_pillow():
+            mockup_renderer.load_template(template_path)
+
+    def attach_mockup(self, upload: ShopifyUpload, mockup: Mockup):
+        """Add the mockup image to a created product; returns the image ID (or None)"""
+        key = hash_inputs('image', self.shopify.shop_url, upload.product.get('id'), Path(mockup.path))
+        cached = self.stages.get('upload', key)
+        if cached:
+            return cached['image_id']
+        alt_text = f"Mockup for {upload.product.get('title')}"
+        image_id = self.shopify.upload_image_to_shopify(str(mockup.path), alt_text, product_id=upload.product['id'])
+        if image_id:
+            self.stages.put('upload', key, {'image_id': image_id})
+        return image_id
+
+    def upload(self, product_data: dict, mockup: Optional[Mockup]) -> Optional[ShopifyUpload]:
+        upload = shopify_stage(product_data, mockup, self.shopify)
+        if upload:
+            self.catalog.upsert(upload.product)
+            self.stages.put('upload', self._upload_key(product_data, mockup),
+                            {'product': upload.product, 'admin_url': upload.admin_url})
+        return upload
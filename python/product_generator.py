@@ -1,71 +1,431 @@
 import os
+import json
+import time
+import base64
+import asyncio
+import argparse
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
 import openai
 from dotenv import load_dotenv
 import requests
 import shutil
+from rate_limiter import RateLimitScheduler, estimate_chat_tokens
+from response_cache import ResponseCache
+from dedup import DedupIndex, DuplicateProductError
+from keywords import KeywordEngine, extract_keywords, product_text
+from artifacts import RunArtifacts
+from metrics import record_openai
+from product_model import (PRODUCT_TOOL, PRODUCT_TOOL_CHOICE, ProductValidationError, TitleWatcher,
+                           image_prompt_for, repair_messages, validate_product)
 
 # Load environment variables from .env file in the same directory
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '.env'))
 
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+# Optional override, e.g. to point the client at a local stand-in server (see fake_servers.py)
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL')
+if OPENAI_BASE_URL:
+    openai.base_url = OPENAI_BASE_URL.rstrip('/') + '/'  # the module client doesn't add the slash itself
+    # Stand-ins don't check the key, but the client requires one
+    OPENAI_API_KEY = OPENAI_API_KEY or 'local-stand-in'
 openai.api_key = OPENAI_API_KEY
 
+CONTENT_PROMPT = (
+    "Generate a creative product idea for a t-shirt. "
+    "Return a JSON with: title, description, and 5-10 tags."
+)
+CONTENT_MODEL = "gpt-3.5-turbo"
+IMAGE_MODEL = "dall-e-3"
+FALLBACK_IMAGE_PROMPT = "A creative t-shirt design"
+CONTENT_PARAMS = {"max_tokens": 300, "temperature": 0.9}
+IMAGE_PARAMS = {"n": 1, "size": "1024x1024"}
+# How many times to regenerate an idea that is a near-duplicate
+MAX_IDEA_ATTEMPTS = 3
+# Extra calls allowed to repair invalid structured output
+MAX_REPAIR_ATTEMPTS = int(os.getenv('OPENAI_MAX_REPAIRS', 2))
+# Stream the product text and start the image as soon as the title is complete
+STREAM_CONTENT = os.getenv('OPENAI_STREAM_CONTENT', '0') == '1'
+# "b64_json" returns the image bytes inline (no second download);
+# "url" downloads from the returned URL, streamed to disk
+IMAGE_RESPONSE_FORMAT = os.getenv('OPENAI_IMAGE_RESPONSE_FORMAT', 'b64_json')
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Reused for image downloads so repeated calls share a keep-alive connection
+_http_session = requests.Session()
+
+# Shared response cache (see response_cache.py for the MERCH_CACHE_* settings)
+response_cache = ResponseCache.from_env()
+
+# Shared TF-IDF keyword corpus (see keywords.py); accepted products join it
+keyword_engine = KeywordEngine.load()
+
+def _add_to_corpus(product):
+    """Add an accepted (not near-duplicate) idea to the keyword corpus; saved per run or batch"""
+    if product is not None:
+        keyword_engine.add_documents([product_text(product)])
+
+def _content_cache_key(variant, use_cache):
+    """Cache key for a content call, or None when the cache should be bypassed.
+
+    ``variant`` distinguishes otherwise identical requests (e.g. batch items)
+    so each one keeps its own cached answer.
+    """
+    if not use_cache or not response_cache.should_cache(CONTENT_PARAMS["temperature"]):
+        return None
+    return response_cache.make_key('chat', CONTENT_MODEL, CONTENT_PROMPT, variant=variant, tool=PRODUCT_TOOL,
+                                   **CONTENT_PARAMS)
+
+def generation_inputs():
+    """Everything that determines a generated product (for stage caching)"""
+    return {
+        "content_model": CONTENT_MODEL, "prompt": CONTENT_PROMPT, "content_params": CONTENT_PARAMS,
+        "tool": PRODUCT_TOOL, "image_model": IMAGE_MODEL, "image_params": IMAGE_PARAMS,
+    }
+
+def _idea_variant(base, attempt):
+    """Cache variant for a regeneration attempt (the first attempt keeps the original key)"""
+    return base if attempt == 0 else f"{base}:retry{attempt}"
+
+def _check_duplicate(product, dedup_index):
+    """Index a new idea; return the near-duplicate it matches instead, if any"""
+    if dedup_index is None or product is None:
+        return None
+    duplicate = dedup_index.add_if_unique(product)
+    if duplicate:
+        print(f"♻️ Too similar to '{duplicate['title']}' ({duplicate['similarity']:.0%}), regenerating...")
+    return duplicate
+
+def _image_cache_key(prompt, use_cache):
+    if not use_cache or not response_cache.should_cache():
+        return None
+    return response_cache.make_key('image', IMAGE_MODEL, prompt, **IMAGE_PARAMS)
+
 # --- Product Content Generation ---
-def generate_product_content():
-    prompt = (
-        "Generate a creative product idea for a t-shirt. "
-        "Return a JSON with: title, description, and 5-10 tags."
-    )
-    response = openai.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[{"role": "user", "content": prompt}],
-        max_tokens=300,
-        temperature=0.9,
-    )
-    content = response.choices[0].message.content
+def _content_request(messages, **extra):
+    """Chat request that asks for the product as create_product function arguments"""
+    return dict(model=CONTENT_MODEL, messages=messages, tools=[PRODUCT_TOOL], tool_choice=PRODUCT_TOOL_CHOICE,
+                **CONTENT_PARAMS, **extra)
+
+def _message_arguments(message):
+    """The create_product arguments of a response message (or its text, if it didn't call it)"""
+    if message.tool_calls:
+        return message.tool_calls[0].function.arguments
+    return message.content
+
+def _stream_arguments(stream, on_title):
+    """Collect streamed function arguments, calling ``on_title`` once the title is complete.
+
+    Returns (arguments, usage); usage arrives in a final chunk without choices.
+    """
+    watcher = TitleWatcher()
+    usage = None
+    for chunk in stream:
+        if getattr(chunk, 'usage', None) is not None:
+            usage = chunk.usage
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+        if delta.tool_calls:
+            function = delta.tool_calls[0].function
+            fragment = function.arguments if function else None
+        else:
+            fragment = delta.content
+        title = watcher.feed(fragment)
+        if title:
+            on_title(title)
+    return watcher.buffer, usage
+
+def _validate_or_repair(raw, messages, attempt):
+    """Validated JSON text, or None plus the follow-up conversation asking for a repair"""
+    try:
+        return validate_product(raw).model_dump_json(), messages
+    except ProductValidationError as e:
+        if attempt >= MAX_REPAIR_ATTEMPTS:
+            raise ProductValidationError(f"Product output still invalid after {MAX_REPAIR_ATTEMPTS} repairs: {e}")
+        print(f"⚠️ Invalid product output ({e}), asking the model to repair it...")
+        return None, repair_messages(messages, raw, e)
+
+def generate_product_content(variant=0, use_cache=True, on_title=None):
+    """Generate a product idea as validated JSON text.
+
+    Output that doesn't validate as a ProductIdea is repaired (up to
+    MAX_REPAIR_ATTEMPTS more calls) or raises ProductValidationError. With
+    ``on_title`` the response is streamed and on_title(title) is called as
+    soon as the title is complete (cached answers don't call it).
+    """
+    cache_key = _content_cache_key(variant, use_cache)
+    if cache_key:
+        cached = response_cache.get_text(cache_key)
+        if cached is not None:
+            return cached
+    messages = [{"role": "user", "content": CONTENT_PROMPT}]
+    chat_pool = RateLimitScheduler.shared().pools['chat']
+    for attempt in range(MAX_REPAIR_ATTEMPTS + 1):
+        estimated_tokens = estimate_chat_tokens(messages, CONTENT_PARAMS["max_tokens"])
+        chat_pool.acquire_blocking(estimated_tokens)
+        started = time.perf_counter()
+        if on_title and attempt == 0:
+            stream = openai.chat.completions.create(**_content_request(
+                messages, stream=True, stream_options={"include_usage": True}))
+            raw, usage = _stream_arguments(stream, on_title)
+        else:
+            response = openai.chat.completions.create(**_content_request(messages))
+            raw, usage = _message_arguments(response.choices[0].message), response.usage
+        record_openai('chat', time.perf_counter() - started, usage)
+        chat_pool.refund(estimated_tokens, getattr(usage, 'total_tokens', None))
+        content, messages = _validate_or_repair(raw, messages, attempt)
+        if content:
+            break
+    if cache_key:
+        response_cache.put_text(cache_key, content)
     return content
 
 # --- Product Image Generation ---
-def generate_product_image(prompt, output_path="generated_image.png"):
+def generate_product_image(prompt, output_path="generated_image.png", use_cache=True):
+    cache_key = _image_cache_key(prompt, use_cache)
+    if cache_key and response_cache.get_file(cache_key, output_path):
+        return output_path
+    # Paced with the batch calls, so worker threads share the same budget
+    RateLimitScheduler.shared().pools['image'].acquire_blocking()
+    started = time.perf_counter()
     dalle_response = openai.images.generate(
-        model="dall-e-3",
+        model=IMAGE_MODEL,
         prompt=prompt,
-        n=1,
-        size="1024x1024"
+        response_format=IMAGE_RESPONSE_FORMAT,
+        **IMAGE_PARAMS
     )
-    image_url = dalle_response.data[0].url
-    img_data = requests.get(image_url).content
+    record_openai('image', time.perf_counter() - started)
+    save_image_data(dalle_response.data[0], output_path)
+    if cache_key:
+        response_cache.put_file(cache_key, output_path)
+    return output_path
+
+def write_b64_to_file(b64_data, output_path, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    """Decode base64 image data to disk a slice at a time"""
+    # Slices must be a multiple of 4 characters to decode independently
+    step = (chunk_size // 3) * 4
     with open(output_path, 'wb') as handler:
-        handler.write(img_data)
+        for start in range(0, len(b64_data), step):
+            handler.write(base64.b64decode(b64_data[start:start + step]))
     return output_path
 
-def extract_keywords(description):
-    # Simple keyword extraction: split, lowercase, remove stopwords, deduplicate
-    stopwords = set(['the', 'a', 'an', 'and', 'or', 'for', 'of', 'to', 'in', 'on', 'with', 'is', 'this', 'that', 'it', 'as', 'at', 'by', 'from'])
-    words = [w.strip('.,!?').lower() for w in description.split()]
-    keywords = [w for w in words if w not in stopwords and len(w) > 2]
-    return list(sorted(set(keywords)))
+def download_to_file(url, output_path, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    """Stream a download to disk over the shared session"""
+    with _http_session.get(url, stream=True, timeout=(10, 120)) as response:
+        response.raise_for_status()
+        with open(output_path, 'wb') as handler:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                handler.write(chunk)
+    return output_path
 
-if __name__ == "__main__":
-    print("Generating product content...")
-    product_json = generate_product_content()
-    print(product_json)
-    # Extract title for image prompt (simple approach)
-    import json
+def save_image_data(image, output_path):
+    """Write an images.generate result item (b64_json or url) to ``output_path``"""
+    if getattr(image, 'b64_json', None):
+        return write_b64_to_file(image.b64_json, output_path)
+    return download_to_file(image.url, output_path)
+
+def parse_product_content(product_json):
+    """Parse model output into (product, image_prompt).
+
+    ``product`` is None when the output is not valid product JSON, in which
+    case the generic fallback image prompt is returned.
+    """
     try:
-        product = json.loads(product_json)
-        image_prompt = f"A high-quality product image for: {product['title']}"
-        # Bonus: extract keywords from description
-        if 'description' in product:
-            product['keywords'] = extract_keywords(product['description'])
-        # Save updated product JSON with keywords
-        with open("product.json", "w") as f:
-            f.write(json.dumps(product, indent=2))
-    except Exception:
-        image_prompt = "A creative t-shirt design"
-        with open("product.json", "w") as f:
-            f.write(product_json)
-    print("Generating product image...")
-    image_path = generate_product_image(image_prompt)
+        product = validate_product(product_json).model_dump()
+    except ProductValidationError:
+        return None, FALLBACK_IMAGE_PROMPT
+    image_prompt = image_prompt_for(product['title'])
+    # Bonus: rank keywords against the corpus of earlier products (it joins the corpus only once accepted)
+    if 'description' in product:
+        product['keywords'] = keyword_engine.product_keywords(product, update=False)
+    return product, image_prompt
+
+def generate_product(image_path="generated_image.png", product_path="product.json", use_cache=True,
+                     dedup_index=None, max_attempts=MAX_IDEA_ATTEMPTS, stream=STREAM_CONTENT, variant=0):
+    """Generate product content and image, returning (product, image_path).
+
+    The content is validated (and repaired if needed) before the image is
+    generated; ProductValidationError is raised if it can't be. With a
+    ``dedup_index``, near-duplicate ideas are regenerated before the image
+    is paid for; DuplicateProductError is raised if every attempt is a
+    duplicate. With ``stream``, the image call starts as soon as the title
+    has streamed in, overlapping the rest of the text (a duplicate idea
+    then costs its image). ``variant`` gives independent products (e.g.
+    queued jobs) their own cached answers.
+    """
+    image_jobs = []  # (prompt, future) for images started from a streamed title
+    with ThreadPoolExecutor(max_workers=1) as image_executor:
+        def start_image(title):
+            prompt = image_prompt_for(title)
+            print(f"Title ready ({title}), generating product image while the text finishes...")
+            image_jobs.append((prompt, image_executor.submit(contextvars.copy_context().run, generate_product_image,
+                                                             prompt, image_path, use_cache)))
+
+        for attempt in range(max_attempts):
+            print("Generating product content...")
+            product_json = generate_product_content(_idea_variant(variant, attempt), use_cache,
+                                                    on_title=start_image if stream else None)
+            print(product_json)
+            product, image_prompt = parse_product_content(product_json)
+            if not _check_duplicate(product, dedup_index):
+                break
+        else:
+            raise DuplicateProductError(f"Every idea was a near-duplicate after {max_attempts} attempts")
+        _add_to_corpus(product)
+        keyword_engine.save()
+        with open(product_path, "w") as f:
+            # Save updated product JSON with keywords, or the raw text if unparseable
+            f.write(json.dumps(product, indent=2) if product is not None else product_json)
+
+        if image_jobs and image_jobs[-1][0] == image_prompt:
+            image_path = image_jobs[-1][1].result()
+        else:
+            # Earlier streamed images write to the same path, so let them finish first
+            wait([future for _, future in image_jobs])
+            print("Generating product image...")
+            image_path = generate_product_image(image_prompt, image_path, use_cache=use_cache)
     print(f"Image saved to {image_path}")
-    print("Product data and image generated.") 
\ No newline at end of file
+    return product, image_path
+
+# --- Batch Generation ---
+async def generate_product_content_async(client, scheduler, variant=0, use_cache=True):
+    cache_key = _content_cache_key(variant, use_cache)
+    if cache_key:
+        cached = response_cache.get_text(cache_key)
+        if cached is not None:
+            return cached
+    messages = [{"role": "user", "content": CONTENT_PROMPT}]
+    for attempt in range(MAX_REPAIR_ATTEMPTS + 1):
+        response = await scheduler.call(
+            'chat', client.chat.completions.with_raw_response.create,
+            estimated_tokens=estimate_chat_tokens(messages, CONTENT_PARAMS["max_tokens"]),
+            **_content_request(messages),
+        )
+        raw = _message_arguments(response.choices[0].message)
+        content, messages = _validate_or_repair(raw, messages, attempt)
+        if content:
+            break
+    if cache_key:
+        response_cache.put_text(cache_key, content)
+    return content
+
+async def generate_product_image_async(client, scheduler, prompt, output_path, use_cache=True):
+    cache_key = _image_cache_key(prompt, use_cache)
+    if cache_key and response_cache.get_file(cache_key, output_path):
+        return output_path
+    dalle_response = await scheduler.call(
+        'image', client.images.with_raw_response.generate,
+        model=IMAGE_MODEL,
+        prompt=prompt,
+        response_format=IMAGE_RESPONSE_FORMAT,
+        **IMAGE_PARAMS
+    )
+    # Decoding/downloading is blocking, so keep it off the event loop
+    await asyncio.to_thread(save_image_data, dalle_response.data[0], output_path)
+    if cache_key:
+        response_cache.put_file(cache_key, output_path)
+    return output_path
+
+async def _generate_batch_item(client, scheduler, index, output_dir, semaphore, use_cache, dedup_index):
+    """Generate one batch item; failures are reported, not raised"""
+    async with semaphore:
+        try:
+            for attempt in range(MAX_IDEA_ATTEMPTS):
+                product_json = await generate_product_content_async(
+                    client, scheduler, _idea_variant(index, attempt), use_cache)
+                product, image_prompt = parse_product_content(product_json)
+                if not _check_duplicate(product, dedup_index):
+                    break
+            else:
+                raise DuplicateProductError(f"Every idea was a near-duplicate after {MAX_IDEA_ATTEMPTS} attempts")
+            _add_to_corpus(product)
+            image_path = os.path.join(output_dir, f"product_{index:05d}.png")
+            await generate_product_image_async(client, scheduler, image_prompt, image_path, use_cache)
+            result = {"index": index, "product": product, "image_path": image_path}
+            if product is None:
+                result["raw"] = product_json
+            return result
+        except Exception as e:
+            return {"index": index, "error": str(e)}
+
+async def generate_products_batch(count, output_dir="batch_output", concurrency=8, client=None,
+                                  scheduler=None, use_cache=True, dedup_index=None):
+    """Generate ``count`` products concurrently, yielding each result as it finishes.
+
+    At most ``concurrency`` products are in flight at once; results arrive
+    in completion order, each tagged with its ``index``. Calls are paced by
+    ``scheduler`` (a shared RateLimitScheduler), which also owns retries.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    # Retries are handled by the scheduler, not the SDK
+    client = client or openai.AsyncOpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL, max_retries=0)
+    scheduler = scheduler or RateLimitScheduler.shared()
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = [
+        asyncio.ensure_future(_generate_batch_item(client, scheduler, i, output_dir, semaphore, use_cache,
+                                                   dedup_index))
+        for i in range(count)
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+        keyword_engine.save()  # once for the whole batch
+
+async def run_batch(count, output_dir="batch_output", concurrency=8, client=None, scheduler=None,
+                    use_cache=True, dedup_index=None):
+    """Run a batch, appending each finished item to ``output_dir/products.jsonl``"""
+    os.makedirs(output_dir, exist_ok=True)
+    out_path = os.path.join(output_dir, "products.jsonl")
+    done = failed = 0
+    with open(out_path, "a") as out:
+        async for result in generate_products_batch(count, output_dir, concurrency, client, scheduler,
+                                                    use_cache, dedup_index):
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            if "error" in result:
+                failed += 1
+                print(f"[{done + failed}/{count}] product {result['index']} failed: {result['error']}")
+            else:
+                done += 1
+                title = (result["product"] or {}).get("title", "(unparsed)")
+                print(f"[{done + failed}/{count}] product {result['index']}: {title}")
+    print(f"Batch complete: {done} generated, {failed} failed. Results in {out_path}")
+    return done, failed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate AI t-shirt products")
+    parser.add_argument("--batch", type=int, metavar="N", help="generate N products concurrently")
+    parser.add_argument("--concurrency", type=int, default=8, help="max products in flight (batch mode)")
+    parser.add_argument("--output-dir", default="batch_output", help="where batch results are written")
+    parser.add_argument("--no-cache", action="store_true", help="always call the API (fresh creative run)")
+    parser.add_argument("--dedup-threshold", type=float, help="similarity above which an idea is a duplicate")
+    parser.add_argument("--no-dedup", action="store_true", help="skip near-duplicate idea detection")
+    parser.add_argument("--stream", action="store_true", default=STREAM_CONTENT,
+                        help="start the image as soon as the title has streamed in")
+    parser.add_argument("--run-id", help="write product.json and the image to runs/<run-id>/ instead of the current directory")
+    args = parser.parse_args(argv)
+
+    use_cache = not args.no_cache
+    dedup_index = None
+    if not args.no_dedup:
+        dedup_index = DedupIndex(threshold=args.dedup_threshold) if args.dedup_threshold else DedupIndex()
+    if args.batch:
+        asyncio.run(run_batch(args.batch, args.output_dir, args.concurrency, use_cache=use_cache,
+                              dedup_index=dedup_index))
+    else:
+        if args.run_id:
+            run = RunArtifacts(args.run_id)
+            generate_product(str(run.path("generated_image.png")), str(run.path("product.json")),
+                             use_cache=use_cache, dedup_index=dedup_index, stream=args.stream)
+        else:
+            generate_product(use_cache=use_cache, dedup_index=dedup_index, stream=args.stream)
+        print("Product data and image generated.")
+    stats = response_cache.stats()
+    print(f"Response cache: {stats['hits']} hits, {stats['misses']} misses")
+
+if __name__ == "__main__":
+    main() 
\ No newline at end of file
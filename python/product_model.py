@@ -0,0 +1,130 @@
+"""
+Merch Maker Lite - Product Model
+================================
+
+Structured output for product ideas: the model is asked to call a
+``create_product`` function whose parameters are the ProductIdea JSON
+schema, and its arguments are validated into a ProductIdea. Invalid output
+is repaired (locally when it is just wrapped in prose or code fences,
+otherwise by asking the model to correct it) instead of silently falling
+back to a generic image prompt.
+
+TitleWatcher spots the ``title`` field in a streamed response as soon as
+it is complete, so the image call can start before the rest of the text
+arrives.
+"""
+
+import re
+import json
+from typing import List
+
+from pydantic import BaseModel, Field, ValidationError, field_validator
+
+
+class ProductValidationError(ValueError):
+    """Model output that could not be validated (or repaired) into a ProductIdea"""
+
+
+class ProductIdea(BaseModel):
+    """A t-shirt product idea"""
+    title: str = Field(min_length=3, max_length=120, description="Short, catchy product title")
+    description: str = Field(min_length=10, max_length=2000, description="Product description for the store")
+    tags: List[str] = Field(min_length=5, max_length=10, description="5-10 short lowercase tags")
+
+    @field_validator('title', 'description')
+    @classmethod
+    def _strip(cls, value):
+        return value.strip()
+
+    @field_validator('tags')
+    @classmethod
+    def _clean_tags(cls, tags):
+        cleaned = []
+        for tag in tags:
+            tag = tag.strip().lower()
+            if tag and tag not in cleaned:
+                cleaned.append(tag)
+        return cleaned
+
+
+PRODUCT_FUNCTION_NAME = "create_product"
+PRODUCT_TOOL = {
+    "type": "function",
+    "function": {
+        "name": PRODUCT_FUNCTION_NAME,
+        "description": "Create a t-shirt product listing",
+        "parameters": ProductIdea.model_json_schema(),
+    },
+}
+PRODUCT_TOOL_CHOICE = {"type": "function", "function": {"name": PRODUCT_FUNCTION_NAME}}
+
+_CODE_FENCE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL)
+_TITLE = re.compile(r'"title"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+def image_prompt_for(title):
+    """The image prompt used for a product title"""
+    return f"A high-quality product image for: {title}"
+
+
+def _extract_json(text):
+    """The JSON object in ``text``, without surrounding prose or code fences"""
+    fenced = _CODE_FENCE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    start, end = text.find('{'), text.rfind('}')
+    return text[start:end + 1] if start != -1 and end > start else text
+
+
+def validate_product(text):
+    """Validate model output into a ProductIdea, repairing wrapped JSON locally"""
+    if not text:
+        raise ProductValidationError("empty response")
+    try:
+        data = json.loads(text)
+    except ValueError:
+        try:
+            data = json.loads(_extract_json(text))
+        except ValueError as e:
+            raise ProductValidationError(f"not valid JSON: {e}") from e
+    try:
+        return ProductIdea.model_validate(data)
+    except ValidationError as e:
+        problems = "; ".join(f"{'.'.join(map(str, err['loc'])) or 'root'}: {err['msg']}" for err in e.errors())
+        raise ProductValidationError(problems) from e
+
+
+def repair_messages(messages, raw, error):
+    """Conversation asking the model to fix its previous, invalid output"""
+    return messages + [
+        {"role": "assistant", "content": raw or ""},
+        {"role": "user", "content": (
+            f"That output was invalid ({error}). Call {PRODUCT_FUNCTION_NAME} again with corrected "
+            "arguments: a title, a description and 5-10 tags."
+        )},
+    ]
+
+
+class TitleWatcher:
+    """Feed streamed argument fragments; reports the title once it is complete"""
+
+    def __init__(self):
+        self.buffer = ""
+        self.title = None
+
+    def feed(self, fragment):
+        """Returns the title the first time it becomes available, else None"""
+        self.buffer += fragment or ""
+        if self.title is not None:
+            return None
+        match = _TITLE.search(self.buffer)
+        if not match:
+            return None
+        try:
+            title = json.loads(f'"{match.group(1)}"').strip()
+        except ValueError:
+            return None
+        if not title:
+            return None
+        self.title = title
+        return title
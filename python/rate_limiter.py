@@ -0,0 +1,253 @@
+"""
+Merch Maker Lite - OpenAI Rate Limit Scheduler
+==============================================
+
+Paces OpenAI calls against requests-per-minute and tokens-per-minute
+budgets so concurrent batches run at a steady maximum rate instead of
+bursting into 429s. Chat and image traffic are scheduled as separate
+pools, each kept in sync with the x-ratelimit-* response headers, and
+rate-limited or failed calls are retried with jittered exponential backoff.
+Synchronous callers (worker threads) wait on the same pools through
+RatePool.acquire_blocking, so the process shares one budget.
+
+Usage:
+    scheduler = RateLimitScheduler.shared()
+    response = await scheduler.call(
+        'chat', client.chat.completions.with_raw_response.create,
+        estimated_tokens=400, model=..., messages=...)
+    scheduler.pools['image'].acquire_blocking()   # before a sync call
+"""
+
+import os
+import re
+import time
+import random
+import asyncio
+import threading
+
+import openai
+
+from metrics import metrics, record_openai
+
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|s|m|h)')
+_DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+
+def parse_reset_duration(value):
+    """Parse OpenAI reset durations like '1s', '6m0s' or '20ms' into seconds"""
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+class _Budget:
+    """A per-minute allowance that refills continuously"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.available = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        elapsed = now - self.updated
+        self.available = min(self.capacity, self.available + elapsed * self.capacity / 60.0)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        self._refill(now)
+        # Requests larger than the whole budget only wait for a full bucket
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) * 60.0 / self.capacity
+
+    def consume(self, amount):
+        self.available -= amount
+
+    def sync(self, limit=None, remaining=None):
+        """Align the local budget with what the server reports"""
+        if limit:
+            self.capacity = float(limit)
+        if remaining is not None:
+            self._refill(time.monotonic())
+            self.available = min(self.available, float(remaining))
+
+
+class RatePool:
+    """Requests/tokens budget for one class of traffic (e.g. chat or image)"""
+
+    def __init__(self, name, requests_per_minute, tokens_per_minute=None):
+        self.name = name
+        self.requests = _Budget(requests_per_minute)
+        self.tokens = _Budget(tokens_per_minute) if tokens_per_minute else None
+        self._blocked_until = 0.0
+        # Guards the budgets only; callers sleep outside it. A thread lock
+        # (not an asyncio one) so threads and event loops share the pool.
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens):
+        """Take one request (and ``tokens`` tokens) if they fit, else return the wait"""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(
+                self._blocked_until - now,
+                self.requests.wait_time(1, now),
+                self.tokens.wait_time(tokens, now) if self.tokens and tokens else 0.0,
+            )
+            if wait <= 0:
+                self.requests.consume(1)
+                if self.tokens and tokens:
+                    self.tokens.consume(tokens)
+            return wait
+
+    async def acquire(self, tokens=0):
+        """Wait until one request (and ``tokens`` tokens) fit in the budget"""
+        while (wait := self._reserve(tokens)) > 0:
+            await asyncio.sleep(wait)
+
+    def acquire_blocking(self, tokens=0):
+        """acquire() for synchronous callers (threads block instead of awaiting)"""
+        while (wait := self._reserve(tokens)) > 0:
+            time.sleep(wait)
+
+    def refund(self, estimated_tokens, actual_tokens):
+        """Correct the token budget once the real usage is known"""
+        if self.tokens and actual_tokens is not None:
+            with self._lock:
+                self.tokens.available = min(self.tokens.capacity,
+                                            self.tokens.available + estimated_tokens - actual_tokens)
+
+    def pause(self, seconds):
+        """Hold back every caller in this pool for ``seconds``"""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def update_from_headers(self, headers):
+        """Sync the budgets with x-ratelimit-* response headers"""
+        if not headers:
+            return
+
+        def _number(key):
+            try:
+                return float(headers[key])
+            except (KeyError, TypeError, ValueError):
+                return None
+
+        self.requests.sync(
+            limit=_number('x-ratelimit-limit-requests'),
+            remaining=_number('x-ratelimit-remaining-requests'),
+        )
+        token_limit = _number('x-ratelimit-limit-tokens')
+        if token_limit and self.tokens is None:
+            self.tokens = _Budget(token_limit)
+        if self.tokens:
+            self.tokens.sync(
+                limit=token_limit,
+                remaining=_number('x-ratelimit-remaining-tokens'),
+            )
+
+
+class RateLimitScheduler:
+    """Shared scheduler for OpenAI calls, with one pool per traffic class"""
+
+    RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, pools, max_retries=6, base_delay=1.0, max_delay=60.0):
+        self.pools = {pool.name: pool for pool in pools}
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+
+    @classmethod
+    def from_env(cls):
+        """Build a scheduler from OPENAI_*_RPM / OPENAI_*_TPM settings"""
+        return cls([
+            RatePool('chat',
+                     requests_per_minute=float(os.getenv('OPENAI_CHAT_RPM', 500)),
+                     tokens_per_minute=float(os.getenv('OPENAI_CHAT_TPM', 200000))),
+            RatePool('image',
+                     requests_per_minute=float(os.getenv('OPENAI_IMAGE_RPM', 50))),
+        ], max_retries=int(os.getenv('OPENAI_MAX_RETRIES', 6)))
+
+    @classmethod
+    def shared(cls):
+        """The process-wide scheduler, so every caller draws on the same budgets"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls.from_env()
+            return cls._shared
+
+    def _backoff(self, attempt, retry_after=None):
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if retry_after:
+            delay = max(delay, retry_after) + random.uniform(0, self.base_delay)
+        return delay
+
+    @staticmethod
+    def _retry_after(headers):
+        if not headers:
+            return None
+        try:
+            if headers.get('retry-after-ms'):
+                return float(headers['retry-after-ms']) / 1000.0
+            if headers.get('retry-after'):
+                return float(headers['retry-after'])
+        except ValueError:
+            pass
+        return parse_reset_duration(headers.get('x-ratelimit-reset-requests'))
+
+    async def call(self, pool_name, create, *args, estimated_tokens=0, **kwargs):
+        """Run a ``with_raw_response`` API call through the named pool.
+
+        Returns the parsed response. 429s, 5xx responses and connection
+        errors are retried up to ``max_retries`` times.
+        """
+        pool = self.pools[pool_name]
+        attempt = 0
+        while True:
+            await pool.acquire(estimated_tokens)
+            started = time.perf_counter()
+            try:
+                raw = await create(*args, **kwargs)
+            except openai.APIStatusError as e:
+                headers = e.response.headers if e.response is not None else None
+                pool.update_from_headers(headers)
+                if e.status_code not in self.RETRYABLE_STATUS or attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt, self._retry_after(headers))
+                if e.status_code == 429:
+                    pool.pause(delay)
+                reason = str(e.status_code)
+            except (openai.APIConnectionError, openai.APITimeoutError):
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                reason = 'connection'
+            else:
+                pool.update_from_headers(raw.headers)
+                response = raw.parse()
+                usage = getattr(response, 'usage', None)
+                if usage is not None:
+                    pool.refund(estimated_tokens, getattr(usage, 'total_tokens', None))
+                record_openai(pool_name, time.perf_counter() - started, usage)
+                return response
+            attempt += 1
+            self.retries += 1
+            metrics.inc('merch_openai_retries_total', kind=pool_name, reason=reason)
+            print(f"⏳ {pool_name} call retry {attempt}/{self.max_retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+def estimate_chat_tokens(messages, max_tokens):
+    """Rough token estimate (~4 characters per token) plus the completion budget"""
+    chars = sum(len(m.get('content') or '') for m in messages)
+    return chars // 4 + max_tokens
@@ -0,0 +1,172 @@
+"""
+Merch Maker Lite - Response Cache
+=================================
+
+Disk-backed, content-addressed cache for OpenAI generation calls. Entries
+are keyed on the model, prompt and sampling parameters, so rerunning the
+pipeline after a downstream failure (or in a development loop) reuses the
+earlier text and image instead of paying for them again.
+
+The cache is capped in size and evicts least-recently-used entries first
+(access time is tracked through the entry file's mtime).
+
+Environment:
+    MERCH_CACHE=0              disable the cache entirely
+    MERCH_CACHE_SAMPLED=1      also cache temperature > 0 (creative) calls; off by
+                               default so new runs get new ideas
+    MERCH_CACHE_DIR=...        cache location (default: python/.cache/responses)
+    MERCH_CACHE_MAX_MB=500     size cap before LRU eviction
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'responses')
+
+
+class ResponseCache:
+    """Content-addressed file cache with a size cap and LRU eviction"""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=500 * 1024 * 1024,
+                 enabled=True, cache_sampled=False):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.cache_sampled = cache_sampled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._size = None
+
+    @classmethod
+    def from_env(cls):
+        """Build the cache from MERCH_CACHE_* environment settings"""
+        return cls(
+            cache_dir=os.getenv('MERCH_CACHE_DIR', DEFAULT_CACHE_DIR),
+            max_bytes=int(float(os.getenv('MERCH_CACHE_MAX_MB', 500)) * 1024 * 1024),
+            enabled=os.getenv('MERCH_CACHE', '1') != '0',
+            cache_sampled=os.getenv('MERCH_CACHE_SAMPLED', '0') == '1',
+        )
+
+    @staticmethod
+    def make_key(kind, model, prompt, **params):
+        """Hash the request into a stable cache key"""
+        payload = json.dumps({'kind': kind, 'model': model, 'prompt': prompt, 'params': params},
+                             sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def should_cache(self, temperature=None):
+        """Whether a call with this sampling temperature may use the cache"""
+        if not self.enabled:
+            return False
+        return self.cache_sampled or not temperature
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def _current_size(self):
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._entries())
+        return self._size
+
+    def _entries(self):
+        if not os.path.isdir(self.cache_dir):
+            return
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    # --- Lookups ---
+    def get_path(self, key):
+        """Return the cached file path for ``key`` (marking it recently used), or None"""
+        path = self._path(key)
+        with self._lock:
+            if os.path.exists(path):
+                try:
+                    os.utime(path)
+                except OSError:
+                    pass
+                self.hits += 1
+                return path
+            self.misses += 1
+            return None
+
+    def get_text(self, key):
+        path = self.get_path(key)
+        if path is None:
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def get_file(self, key, dest_path):
+        """Copy the cached bytes for ``key`` to ``dest_path``; True on a hit"""
+        path = self.get_path(key)
+        if path is None:
+            return False
+        shutil.copyfile(path, dest_path)
+        return True
+
+    # --- Stores ---
+    def _store(self, key, write):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            size = os.path.getsize(tmp_path)
+            with self._lock:
+                # Measured before the replace, so a first walk doesn't count the new file too
+                current = self._current_size()
+                existing = os.path.getsize(path) if os.path.exists(path) else 0
+                os.replace(tmp_path, path)
+                self._size = current + size - existing
+                if self._size > self.max_bytes:
+                    self._evict()
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def put_text(self, key, text):
+        self._store(key, lambda f: f.write(text.encode('utf-8')))
+
+    def put_file(self, key, src_path):
+        def _copy(f):
+            with open(src_path, 'rb') as src:
+                shutil.copyfileobj(src, f)
+        self._store(key, _copy)
+
+    def _evict(self):
+        """Delete least-recently-used entries until under the size cap"""
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._size = total
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'bytes': self._current_size(),
+        }
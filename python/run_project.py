@@ -16,8 +16,6 @@ Usage:
 
 import os
 import sys
-import subprocess
-from pathlib import Path
 
 def check_shopify_credentials():
     """Check if Shopify credentials are properly configured"""
@@ -30,7 +28,8 @@ def check_shopify_credentials():
         
         if shop_url and access_token and not shop_url.startswith('your-'):
             return True
-        return False
+        # A local stand-in (fake_servers.py) needs no credentials
+        return bool(os.getenv('SHOPIFY_API_BASE_URL'))
     except:
         return False
 
@@ -44,7 +43,7 @@ def check_openai_credentials():
         
         if api_key and not api_key.startswith('your-'):
             return True
-        return False
+        return bool(os.getenv('OPENAI_BASE_URL'))
     except:
         return False
 
@@ -54,15 +53,13 @@ def run_shopify_demo():
     print("=" * 50)
     
     try:
-        result = subprocess.run([sys.executable, 'demo_shopify.py'], 
-                              capture_output=True, text=True, cwd=Path(__file__).parent)
+        import demo_shopify
         
-        if result.returncode == 0:
+        if demo_shopify.main():
             print("✅ Shopify demo completed successfully!")
             return True
         else:
-            print("❌ Shopify demo failed:")
-            print(result.stderr)
+            print("❌ Shopify demo failed.")
             return False
     except Exception as e:
         print(f"❌ Error running Shopify demo: {e}")
@@ -74,15 +71,13 @@ def run_simulation():
     print("=" * 50)
     
     try:
-        result = subprocess.run([sys.executable, 'orchestrator.py'], 
-                              capture_output=True, text=True, cwd=Path(__file__).parent)
+        import orchestrator
         
-        if result.returncode == 0:
+        if orchestrator.run_pipeline():
             print("✅ Simulation completed successfully!")
             return True
         else:
-            print("❌ Simulation failed:")
-            print(result.stderr)
+            print("❌ Simulation failed.")
             return False
     except Exception as e:
         print(f"❌ Error running simulation: {e}")
@@ -94,15 +89,13 @@ def run_full_pipeline():
     print("=" * 50)
     
     try:
-        result = subprocess.run([sys.executable, 'orchestrator_shopify.py'], 
-                              capture_output=True, text=True, cwd=Path(__file__).parent)
+        import orchestrator_shopify
         
-        if result.returncode == 0:
+        if orchestrator_shopify.main():
             print("✅ Full pipeline completed successfully!")
             return True
         else:
-            print("❌ Full pipeline failed:")
-            print(result.stderr)
+            print("❌ Full pipeline failed.")
             return False
     except Exception as e:
         print(f"❌ Error running full pipeline: {e}")
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Merch Maker Lite - Bulk Shopify Product Creation
+================================================
+
+Creates many products through the GraphQL Admin API instead of one REST
+POST per product.
+
+Two modes:
+- batched: a few dozen items, several aliased productCreate mutations per
+  GraphQL request
+- bulk: catalog-sized imports; the inputs are written to a JSONL file,
+  uploaded to a staged target, run as a bulk mutation, polled until
+  finished, and the result lines are mapped back to the local items
+
+Local images (a batch row's ``image_path``) are sent to staged upload
+targets first and attached by URL, like ``image_urls``.
+
+Usage:
+    python shopify_bulk.py batch_output/products.jsonl           # auto mode
+    python shopify_bulk.py batch_output/products.jsonl --mode bulk
+"""
+
+import os
+import json
+import time
+import argparse
+import mimetypes
+import tempfile
+
+import requests
+
+from shopify_integration import ShopifyIntegration, ShopifyAPIError
+
+# Items above this count go through a bulk operation in "auto" mode
+BULK_THRESHOLD = 50
+
+PRODUCT_CREATE_FIELDS = '''
+    product { id handle title status }
+    userErrors { field message }
+'''
+
+BULK_PRODUCT_MUTATION = '''
+mutation call($input: ProductInput!, $media: [CreateMediaInput!]) {
+  productCreate(input: $input, media: $media) {%s}
+}
+''' % PRODUCT_CREATE_FIELDS
+
+BULK_RUN_MUTATION = '''
+mutation bulkOperationRunMutation($mutation: String!, $stagedUploadPath: String!) {
+  bulkOperationRunMutation(mutation: $mutation, stagedUploadPath: $stagedUploadPath) {
+    bulkOperation { id status }
+    userErrors { field message }
+  }
+}
+'''
+
+BULK_STATUS_QUERY = '''
+query bulkOperation($id: ID!) {
+  node(id: $id) {
+    ... on BulkOperation { id status errorCode objectCount url partialDataUrl }
+  }
+}
+'''
+
+BULK_FINISHED = {'COMPLETED', 'FAILED', 'CANCELED', 'EXPIRED'}
+
+
+def build_product_input(product_data):
+    """Map local product data to GraphQL productCreate variables"""
+    product_input = {
+        "title": product_data.get('title', 'AI Generated T-Shirt'),
+        "descriptionHtml": product_data.get('description', 'AI-generated t-shirt design'),
+        "vendor": "AI Merch Maker",
+        "productType": "T-Shirt",
+        "tags": product_data.get('tags', []),
+        "status": "DRAFT",  # Start as draft for safety
+        "variants": [
+            {
+                "price": "19.99",
+                "compareAtPrice": "24.99"
+            }
+        ]
+    }
+    media = [
+        {"originalSource": src, "mediaContentType": "IMAGE",
+         "alt": f"Mockup for {product_data.get('title')}"}
+        for src in product_data.get('image_urls', [])
+    ]
+    return {"input": product_input, "media": media}
+
+
+def _result(index, payload):
+    """Normalise a productCreate payload into a per-item result"""
+    payload = payload or {}
+    errors = payload.get('userErrors') or []
+    return {"index": index, "product": payload.get('product'), "errors": errors}
+
+
+class BulkProductCreator:
+    """Creates products in batches or as a GraphQL bulk operation"""
+
+    def __init__(self, shopify=None, batch_size=10, poll_interval=2.0, timeout=3600):
+        self.shopify = shopify or ShopifyIntegration.shared()
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+
+    def create_products(self, items, mode='auto'):
+        """Create ``items`` (local product dicts); returns one result per item, in order"""
+        items = self.stage_images(items)
+        if mode == 'auto':
+            mode = 'bulk' if len(items) > BULK_THRESHOLD else 'batched'
+        if mode == 'bulk':
+            return self.create_bulk(items)
+        return self.create_batched(items)
+
+    def stage_images(self, items):
+        """Upload each item's local ``image_path`` and add it to the item's ``image_urls``.
+
+        GraphQL media only take URLs. An image that is missing or fails to
+        upload is left out with a warning; the product is still created.
+        """
+        staged = []
+        for index, item in enumerate(items):
+            image_path = item.get('image_path')
+            if not image_path:
+                staged.append(item)
+                continue
+            item = {key: value for key, value in item.items() if key != 'image_path'}
+            if not os.path.exists(image_path):
+                print(f"⚠️ Item {index}: image {image_path} not found, creating the product without it")
+                staged.append(item)
+                continue
+            mime_type = mimetypes.guess_type(image_path)[0] or 'image/png'
+            try:
+                resource_url, _ = self.shopify.staged_upload(image_path, 'IMAGE', mime_type)
+            except (ShopifyAPIError, requests.RequestException) as e:
+                print(f"⚠️ Item {index}: image upload failed ({e}), creating the product without it")
+                staged.append(item)
+                continue
+            staged.append({**item, 'image_urls': [resource_url, *item.get('image_urls', [])]})
+        return staged
+
+    # --- Batched mutations ---
+    def create_batched(self, items):
+        """Create products with several aliased productCreate mutations per request"""
+        results = []
+        for start in range(0, len(items), self.batch_size):
+            chunk = items[start:start + self.batch_size]
+            params = ", ".join(f"$i{n}: ProductInput!, $m{n}: [CreateMediaInput!]" for n in range(len(chunk)))
+            fields = "\n".join(
+                f"  p{n}: productCreate(input: $i{n}, media: $m{n}) {{{PRODUCT_CREATE_FIELDS}}}"
+                for n in range(len(chunk))
+            )
+            query = f"mutation batchCreate({params}) {{\n{fields}\n}}"
+            variables = {}
+            for n, item in enumerate(chunk):
+                product_vars = build_product_input(item)
+                variables[f"i{n}"] = product_vars["input"]
+                variables[f"m{n}"] = product_vars["media"]
+            try:
+                data = self.shopify.graphql(query, variables) or {}
+            except (ShopifyAPIError, requests.RequestException) as e:
+                results.extend({"index": start + n, "product": None, "errors": [{"message": str(e)}]}
+                               for n in range(len(chunk)))
+                continue
+            results.extend(_result(start + n, data.get(f"p{n}")) for n in range(len(chunk)))
+        return results
+
+    # --- Bulk operation ---
+    def write_jsonl(self, items, path):
+        """Write one line of mutation variables per item"""
+        with open(path, 'w', encoding='utf-8') as f:
+            for item in items:
+                f.write(json.dumps(build_product_input(item)) + "\n")
+        return path
+
+    def stage_upload(self, path):
+        """Upload the JSONL variables file and return its stagedUploadPath"""
+        resource_url, staged_path = self.shopify.staged_upload(path, 'BULK_MUTATION_VARIABLES', 'text/jsonl')
+        return staged_path or resource_url
+
+    def run_bulk_mutation(self, staged_upload_path):
+        data = self.shopify.graphql(BULK_RUN_MUTATION, {
+            "mutation": BULK_PRODUCT_MUTATION,
+            "stagedUploadPath": staged_upload_path,
+        })
+        payload = data['bulkOperationRunMutation']
+        if payload.get('userErrors'):
+            raise ShopifyAPIError(f"Bulk mutation failed: {payload['userErrors']}", payload['userErrors'])
+        return payload['bulkOperation']['id']
+
+    def wait_for(self, operation_id):
+        """Poll the bulk operation until it finishes and return its final state"""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            operation = self.shopify.graphql(BULK_STATUS_QUERY, {"id": operation_id})['node']
+            if operation['status'] in BULK_FINISHED:
+                return operation
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Bulk operation {operation_id} still {operation['status']}")
+            print(f"⏳ Bulk operation {operation['status'].lower()}: {operation.get('objectCount', 0)} done")
+            time.sleep(self.poll_interval)
+
+    def fetch_results(self, url, count):
+        """Map result lines back to item indexes via __lineNumber"""
+        results = [{"index": i, "product": None, "errors": [{"message": "no result returned"}]}
+                   for i in range(count)]
+        with requests.get(url, stream=True, timeout=self.shopify.timeout) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                row = json.loads(line)
+                index = row.get('__lineNumber')
+                if index is None or not 0 <= index < count:
+                    continue
+                results[index] = _result(index, (row.get('data') or {}).get('productCreate'))
+        return results
+
+    def create_bulk(self, items, jsonl_path=None):
+        """Create products through a staged JSONL upload and a bulk mutation"""
+        if not items:
+            return []
+        owns_file = jsonl_path is None
+        if owns_file:
+            fd, jsonl_path = tempfile.mkstemp(suffix='.jsonl')
+            os.close(fd)
+        try:
+            self.write_jsonl(items, jsonl_path)
+            staged_path = self.stage_upload(jsonl_path)
+            operation_id = self.run_bulk_mutation(staged_path)
+            print(f"🚚 Bulk operation started: {operation_id}")
+            operation = self.wait_for(operation_id)
+        finally:
+            if owns_file and os.path.exists(jsonl_path):
+                os.remove(jsonl_path)
+
+        url = operation.get('url') or operation.get('partialDataUrl')
+        if operation['status'] != 'COMPLETED':
+            print(f"❌ Bulk operation {operation['status']}: {operation.get('errorCode')}")
+        if not url:
+            message = f"bulk operation {operation['status'].lower()}"
+            return [{"index": i, "product": None, "errors": [{"message": message}]} for i in range(len(items))]
+        return self.fetch_results(url, len(items))
+
+
+def load_items(path):
+    """Read products from a product_generator batch file (or plain product JSONL).
+
+    Batch rows that failed to generate (an ``error`` and no product) are
+    skipped; a row's ``image_path`` is kept on its product.
+    """
+    items = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            if 'index' not in row:
+                items.append(row)
+                continue
+            product = row.get('product')
+            if not product:
+                print(f"⚠️ Skipping batch item {row['index']}: {row.get('error') or 'no product'}")
+                continue
+            if row.get('image_path'):
+                product = {**product, 'image_path': row['image_path']}
+            items.append(product)
+    return items
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create products in Shopify in bulk")
+    parser.add_argument("input", help="JSONL file of products (e.g. batch_output/products.jsonl)")
+    parser.add_argument("--mode", choices=["auto", "batched", "bulk"], default="auto")
+    parser.add_argument("--batch-size", type=int, default=10, help="mutations per request in batched mode")
+    args = parser.parse_args(argv)
+
+    items = load_items(args.input)
+    print(f"📦 Creating {len(items)} products ({args.mode} mode)...")
+    creator = BulkProductCreator(batch_size=args.batch_size)
+    results = creator.create_products(items, mode=args.mode)
+    created = [r for r in results if r['product']]
+    for r in results:
+        if not r['product']:
+            print(f"❌ Item {r['index']} failed: {r['errors']}")
+    print(f"✅ Created {len(created)}/{len(items)} products")
+    return len(created) == len(items)
+
+
+if __name__ == "__main__":
+    main()
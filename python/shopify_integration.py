@@ -1,9 +1,17 @@
 import os
+import time
+import random
 import requests
 import json
-import base64
+import mimetypes
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 from pathlib import Path
+from upload_streams import attachment_placeholder, json_body, multipart_body
+from metrics import metrics
 
 # Load environment variables with error handling
 try:
@@ -12,49 +20,318 @@ except Exception as e:
     print(f"Warning: Could not load .env file: {e}")
     print("Using default placeholder values")
 
+STAGED_UPLOAD_MUTATION = '''
+mutation stagedUploadsCreate($input: [StagedUploadInput!]!) {
+  stagedUploadsCreate(input: $input) {
+    stagedTargets { url resourceUrl parameters { name value } }
+    userErrors { field message }
+  }
+}
+'''
+
+class ShopifyAPIError(Exception):
+    """Raised when the Admin API returns errors for a request"""
+    
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.errors = errors or []
+
+class ShopifyRateLimiter:
+    """Client-side model of Shopify's leaky bucket for REST Admin API calls.
+    
+    The bucket fills by one per request and leaks at a fixed rate; its real
+    fill level is re-synced from the X-Shopify-Shop-Api-Call-Limit header
+    after every response. Requests are paced to keep ``headroom`` calls
+    below the limit so the store's full rate is used without tripping 429s.
+    """
+    
+    def __init__(self, bucket_size=40, leak_rate=2.0, headroom=2):
+        self.bucket_size = bucket_size
+        self.leak_rate = leak_rate
+        self.headroom = headroom
+        self.level = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _leak(self, now):
+        self.level = max(0.0, self.level - (now - self._updated) * self.leak_rate)
+        self._updated = now
+    
+    def acquire(self):
+        """Block until one more call fits under the limit"""
+        while True:
+            # Sleep outside the lock, so update() and fill aren't held up meanwhile
+            with self._lock:
+                self._leak(time.monotonic())
+                limit = max(self.bucket_size - self.headroom, 1)
+                if self.level + 1 <= limit:
+                    self.level += 1
+                    return
+                wait = (self.level + 1 - limit) / self.leak_rate
+            time.sleep(wait)
+    
+    def update(self, call_limit):
+        """Sync with a 'used/size' X-Shopify-Shop-Api-Call-Limit header value"""
+        try:
+            used, size = (int(part) for part in call_limit.split('/'))
+        except (AttributeError, ValueError):
+            return
+        with self._lock:
+            self._leak(time.monotonic())
+            self.level = float(used)
+            if size != self.bucket_size:
+                # Standard stores leak 2/s on a 40 bucket, Plus 20/s on 400
+                self.bucket_size = size
+                self.leak_rate = size / 20.0
+    
+    def saturate(self):
+        """Treat the bucket as full, e.g. after a 429"""
+        with self._lock:
+            self._leak(time.monotonic())
+            self.level = float(self.bucket_size)
+    
+    @property
+    def fill(self):
+        """Current estimated bucket fill, 0.0 - 1.0"""
+        with self._lock:
+            self._leak(time.monotonic())
+            return self.level / self.bucket_size
+
 class ShopifyIntegration:
-    def __init__(self):
+    # Shared instances, keyed by store and token (see ShopifyIntegration.shared)
+    _instances = {}
+    _instances_lock = threading.Lock()
+    # One call-limit bucket per store, shared by every client for that store
+    _rate_limiters = {}
+    _rate_limiters_lock = threading.Lock()
+    
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+    
+    def __init__(self, pool_size=None, timeout=None, max_retries=None, base_url=None):
         # Use environment variables for credentials
         self.shop_url = os.getenv('SHOPIFY_SHOP_URL', 'your-store.myshopify.com')
         self.access_token = os.getenv('SHOPIFY_ACCESS_TOKEN', 'your-access-token')
         self.api_version = '2024-01'  # Latest stable version
+        # Optional override, e.g. to point the client at a local stand-in server (see fake_servers.py)
+        base_url = base_url or os.getenv('SHOPIFY_API_BASE_URL')
         
-        if not self.shop_url or not self.access_token or self.shop_url == 'your-store.myshopify.com':
+        # Real credentials are only needed when talking to a real store
+        if not base_url and (not self.shop_url or not self.access_token or self.shop_url == 'your-store.myshopify.com'):
             raise ValueError("SHOPIFY_SHOP_URL and SHOPIFY_ACCESS_TOKEN must be set in .env file")
         
         # Remove https:// and trailing slash if present
         self.shop_url = self.shop_url.replace('https://', '').replace('http://', '').rstrip('/')
-        self.base_url = f"https://{self.shop_url}/admin/api/{self.api_version}"
+        self.base_url = base_url.rstrip('/') if base_url else f"https://{self.shop_url}/admin/api/{self.api_version}"
         
         self.headers = {
             'Content-Type': 'application/json',
             'X-Shopify-Access-Token': self.access_token
         }
+        
+        # Pooled keep-alive session so calls reuse TCP+TLS connections
+        pool_size = pool_size or int(os.getenv('SHOPIFY_POOL_SIZE', 10))
+        self.timeout = timeout or (
+            float(os.getenv('SHOPIFY_CONNECT_TIMEOUT', 5)),
+            float(os.getenv('SHOPIFY_READ_TIMEOUT', 60))
+        )
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        
+        # Call-limit throttling and retries
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('SHOPIFY_MAX_RETRIES', 5))
+        self.retries = 0
+        # A stand-in server (base_url override) has its own bucket, not the real store's
+        with self._rate_limiters_lock:
+            self.rate_limiter = self._rate_limiters.setdefault(base_url or self.shop_url, ShopifyRateLimiter())
+        
+        # Upload images through staged uploads instead of inline base64
+        self.staged_image_uploads = os.getenv('SHOPIFY_STAGED_UPLOADS', '0') == '1'
+    
+    @classmethod
+    def shared(cls, **kwargs):
+        """Return the process-wide instance for the configured store and settings, creating it once"""
+        key = (os.getenv('SHOPIFY_SHOP_URL'), os.getenv('SHOPIFY_ACCESS_TOKEN'),
+               kwargs.get('base_url') or os.getenv('SHOPIFY_API_BASE_URL'), tuple(sorted(kwargs.items())))
+        with cls._instances_lock:
+            instance = cls._instances.get(key)
+            if instance is None:
+                instance = cls(**kwargs)
+                cls._instances[key] = instance
+            return instance
+    
+    def close(self):
+        """Close pooled connections"""
+        self.session.close()
+        with self._instances_lock:
+            for key, instance in list(self._instances.items()):
+                if instance is self:
+                    del self._instances[key]
+    
+    def _backoff(self, attempt, retry_after=None):
+        delay = random.uniform(0.5, 1.0) * min(30.0, 2 ** attempt)
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        return delay
+    
+    def _request(self, method, path, throttle=True, idempotent=None, **kwargs):
+        """Send a request to the Admin API over the pooled session.
+        
+        REST calls are paced by the store's call-limit bucket (pass
+        ``throttle=False`` for GraphQL, which is cost-limited instead);
+        429 and 5xx responses (and connection failures) are retried with
+        backoff, so the caller only sees the final response.
+        
+        Non-idempotent requests (POSTs, unless ``idempotent`` says
+        otherwise) may already have been applied when a 5xx or dropped
+        connection comes back, so they are only retried on 429 and
+        connect timeouts, which the store never processed.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        if idempotent is None:
+            idempotent = method != 'POST'
+        retry_status = self.RETRY_STATUS if idempotent else {429}
+        url = path if path.startswith('http') else f"{self.base_url}{path}"
+        attempt = 0
+        while True:
+            if throttle:
+                self.rate_limiter.acquire()
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.ConnectionError as e:
+                if attempt >= self.max_retries or not (idempotent or isinstance(e, requests.ConnectTimeout)):
+                    raise
+                delay = self._backoff(attempt)
+                reason = str(e)
+                metrics.inc('merch_shopify_retries_total', reason='connection')
+            else:
+                metrics.observe('merch_shopify_request_seconds', time.perf_counter() - started, method=method)
+                metrics.inc('merch_shopify_requests_total', method=method, status=response.status_code)
+                self.rate_limiter.update(response.headers.get('X-Shopify-Shop-Api-Call-Limit'))
+                metrics.set('merch_shopify_call_limit_fill', round(self.rate_limiter.fill, 3), shop=self.shop_url)
+                if response.status_code not in retry_status or attempt >= self.max_retries:
+                    return response
+                if response.status_code == 429:
+                    self.rate_limiter.saturate()
+                delay = self._backoff(attempt, response.headers.get('Retry-After'))
+                reason = f"HTTP {response.status_code}"
+                metrics.inc('merch_shopify_retries_total', reason=response.status_code)
+            attempt += 1
+            self.retries += 1
+            print(f"⏳ Shopify {method} {path} failed ({reason}), retry {attempt}/{self.max_retries} in {delay:.1f}s")
+            time.sleep(delay)
+    
+    def graphql(self, query, variables=None):
+        """Run a GraphQL Admin API request and return its ``data``.
+        
+        THROTTLED responses are retried once enough query cost has been
+        restored; any other errors raise ShopifyAPIError. Queries are
+        retried on 5xx as well, mutations (which may have run) are not.
+        """
+        idempotent = not query.lstrip().startswith('mutation')
+        attempt = 0
+        while True:
+            response = self._request('POST', '/graphql.json', throttle=False, idempotent=idempotent,
+                                     json={'query': query, 'variables': variables or {}})
+            if response.status_code != 200:
+                raise ShopifyAPIError(f"GraphQL request failed: {response.status_code} - {response.text}")
+            body = response.json()
+            errors = body.get('errors')
+            if not errors:
+                return body.get('data')
+            throttled = any((e.get('extensions') or {}).get('code') == 'THROTTLED' for e in errors)
+            if not throttled or attempt >= self.max_retries:
+                raise ShopifyAPIError(f"GraphQL errors: {errors}", errors)
+            cost = (body.get('extensions') or {}).get('cost') or {}
+            status = cost.get('throttleStatus') or {}
+            shortfall = cost.get('requestedQueryCost', 0) - status.get('currentlyAvailable', 0)
+            delay = max(shortfall / max(status.get('restoreRate', 50), 1), 0) + random.uniform(0, 0.5)
+            attempt += 1
+            self.retries += 1
+            metrics.inc('merch_shopify_retries_total', reason='throttled')
+            print(f"⏳ Shopify GraphQL throttled, retry {attempt}/{self.max_retries} in {delay:.1f}s")
+            time.sleep(delay)
+    
+    def staged_upload(self, file_path, resource='IMAGE', mime_type='image/png'):
+        """Stream a local file to a Shopify staged upload target.
+        
+        Returns (resource_url, staged_upload_path): the URL to reference the
+        file from products/media, and the path bulk operations expect.
+        """
+        data = self.graphql(STAGED_UPLOAD_MUTATION, {"input": [{
+            "resource": resource,
+            "filename": Path(file_path).name,
+            "mimeType": mime_type,
+            "fileSize": str(os.path.getsize(file_path)),
+            "httpMethod": "POST",
+        }]})
+        payload = data['stagedUploadsCreate']
+        if payload.get('userErrors'):
+            raise ShopifyAPIError(f"Staged upload failed: {payload['userErrors']}", payload['userErrors'])
+        target = payload['stagedTargets'][0]
+        fields = [(param['name'], param['value']) for param in target['parameters']]
+        body, content_type = multipart_body(fields, 'file', str(file_path), content_type=mime_type)
+        metrics.inc('merch_shopify_upload_bytes_total', len(body))
+        
+        # The staged target is not the Admin API, so don't send the access token
+        response = self.session.post(target['url'], data=body, timeout=self.timeout,
+                                     headers={'Content-Type': content_type, 'X-Shopify-Access-Token': None})
+        if response.status_code not in (200, 201, 204):
+            raise ShopifyAPIError(f"Staged upload failed: {response.status_code} - {response.text}")
+        return target.get('resourceUrl'), dict(fields).get('key')
     
-    def upload_image_to_shopify(self, image_path, alt_text="Product Image"):
-        """Upload an image to Shopify and return the image ID"""
+    def _image_entries(self, image_sources, alt_text, staged=None):
+        """Build REST image entries for ``image_sources`` (URLs or local paths).
+        
+        Returns (entries, attachments): local files become streamed base64
+        attachments keyed by placeholder, or staged-upload URLs when
+        ``staged`` is set.
+        """
+        staged = self.staged_image_uploads if staged is None else staged
+        entries, attachments = [], {}
+        for source in image_sources:
+            source = str(source)
+            if source.startswith(('http://', 'https://')):
+                entries.append({"src": source, "alt": alt_text})
+            elif staged:
+                mime_type = mimetypes.guess_type(source)[0] or 'image/png'
+                entries.append({"src": self.staged_upload(source, mime_type=mime_type)[0], "alt": alt_text})
+            else:
+                placeholder = attachment_placeholder()
+                attachments[placeholder] = source
+                entries.append({"attachment": placeholder, "filename": Path(source).name, "alt": alt_text})
+        return entries, attachments
+    
+    def _post_json(self, path, payload, attachments=None):
+        """POST a JSON payload, streaming any attachment files into the body"""
+        if attachments:
+            body = json_body(payload, attachments)
+            metrics.inc('merch_shopify_upload_bytes_total', len(body))
+            return self._request('POST', path, data=body)
+        return self._request('POST', path, json=payload)
+    
+    def upload_image_to_shopify(self, image_path, alt_text="Product Image", staged=None, product_id=None):
+        """Upload an image to Shopify and return the image ID.
+        
+        With ``product_id`` the image is attached to that product. The file
+        is streamed from disk: either base64-encoded chunk by chunk into the
+        request body, or (``staged=True``) sent to a staged upload target
+        and referenced by URL.
+        """
         try:
-            # Read and encode the image
-            with open(image_path, 'rb') as image_file:
-                image_data = base64.b64encode(image_file.read()).decode('utf-8')
-            
-            # Prepare the image data
-            image_payload = {
-                "image": {
-                    "attachment": image_data,
-                    "filename": Path(image_path).name,
-                    "alt": alt_text
-                }
-            }
+            entries, attachments = self._image_entries([image_path], alt_text, staged)
+            path = f'/products/{product_id}/images.json' if product_id else '/images.json'
             
             # Upload image to Shopify
-            response = requests.post(
-                f"{self.base_url}/images.json",
-                headers=self.headers,
-                json=image_payload
-            )
+            response = self._post_json(path, {"image": entries[0]}, attachments)
             
-            if response.status_code == 201:
+            if response.status_code in (200, 201):
                 image_data = response.json()
                 return image_data['image']['id']
             else:
@@ -65,9 +342,19 @@ class ShopifyIntegration:
             print(f"Error uploading image: {e}")
             return None
     
-    def create_product(self, product_data, mockup_path=None):
-        """Create a product in Shopify"""
+    def create_product(self, product_data, mockup_path=None, images=None, inline_images=True):
+        """Create a product in Shopify.
+        
+        The mockup and any extra ``images`` (URLs or local paths) are sent
+        in the create request itself. With ``inline_images=False`` they are
+        uploaded afterwards, one call per image.
+        """
         try:
+            image_sources = list(images or []) + list(product_data.get('image_urls', []))
+            if mockup_path and os.path.exists(mockup_path):
+                image_sources.insert(0, mockup_path)
+            alt_text = f"Mockup for {product_data.get('title')}"
+            
             # Prepare product payload
             product_payload = {
                 "product": {
@@ -94,25 +381,27 @@ class ShopifyIntegration:
                     ]
                 }
             }
+            attachments = None
+            if inline_images and image_sources:
+                product_payload["product"]["images"], attachments = self._image_entries(image_sources, alt_text)
             
             # Create the product
-            response = requests.post(
-                f"{self.base_url}/products.json",
-                headers=self.headers,
-                json=product_payload
-            )
+            response = self._post_json('/products.json', product_payload, attachments)
             
             if response.status_code == 201:
                 product_info = response.json()
                 product_id = product_info['product']['id']
                 print(f"✅ Product created successfully! ID: {product_id}")
+                if inline_images and image_sources:
+                    print(f"✅ {len(image_sources)} image(s) attached in the create request")
                 
-                # Upload mockup image if provided
-                if mockup_path and os.path.exists(mockup_path):
-                    print("📸 Uploading mockup image...")
-                    image_id = self.upload_image_to_shopify(mockup_path, f"Mockup for {product_data.get('title')}")
-                    if image_id:
-                        print(f"✅ Image uploaded successfully! Image ID: {image_id}")
+                # Upload images separately if not sent inline
+                if not inline_images:
+                    for source in image_sources:
+                        print("📸 Uploading mockup image...")
+                        image_id = self.upload_image_to_shopify(source, alt_text, product_id=product_id)
+                        if image_id:
+                            print(f"✅ Image uploaded successfully! Image ID: {image_id}")
                 
                 return product_info['product']
             else:
@@ -126,10 +415,7 @@ class ShopifyIntegration:
     def get_products(self, limit=10):
         """Get list of products from Shopify"""
         try:
-            response = requests.get(
-                f"{self.base_url}/products.json?limit={limit}",
-                headers=self.headers
-            )
+            response = self._request('GET', '/products.json', params={'limit': limit})
             
             if response.status_code == 200:
                 return response.json()['products']
@@ -141,6 +427,52 @@ class ShopifyIntegration:
             print(f"Error getting products: {e}")
             return []
     
+    def iter_products(self, fields=None, updated_at_min=None, status=None, page_size=250, prefetch=True):
+        """Yield every product in the store, following Link-header cursor pagination.
+        
+        ``fields`` limits each product to the listed attributes (e.g.
+        ['id', 'title']); ``updated_at_min`` and ``status`` filter the scan.
+        With ``prefetch`` the next page is fetched while the caller works
+        through the current one, so at most two pages are held in memory.
+        Raises ShopifyAPIError if a page cannot be fetched.
+        """
+        if fields and not isinstance(fields, str):
+            fields = ",".join(fields)
+        if updated_at_min is not None and hasattr(updated_at_min, 'isoformat'):
+            updated_at_min = updated_at_min.isoformat()
+        params = {'limit': min(page_size, 250)}
+        if fields:
+            params['fields'] = fields
+        if updated_at_min:
+            params['updated_at_min'] = updated_at_min
+        if status:
+            params['status'] = status
+        
+        def fetch_page(path, page_params):
+            response = self._request('GET', path, params=page_params)
+            if response.status_code != 200:
+                raise ShopifyAPIError(f"Failed to get products: {response.status_code} - {response.text}")
+            return response.json()['products'], response.links.get('next', {}).get('url')
+        
+        def next_params(url):
+            # page_info requests only accept limit (already in the URL) and fields
+            return {'fields': fields} if fields and 'fields=' not in url else None
+        
+        executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        try:
+            products, next_url = fetch_page('/products.json', params)
+            while True:
+                pending = None
+                if executor and next_url:
+                    pending = executor.submit(contextvars.copy_context().run, fetch_page, next_url, next_params(next_url))
+                yield from products
+                if not next_url:
+                    return
+                products, next_url = pending.result() if pending else fetch_page(next_url, next_params(next_url))
+        finally:
+            if executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+    
     def publish_product(self, product_id):
         """Publish a product (change status from draft to active)"""
         try:
@@ -151,11 +483,7 @@ class ShopifyIntegration:
                 }
             }
             
-            response = requests.put(
-                f"{self.base_url}/products/{product_id}.json",
-                headers=self.headers,
-                json=product_payload
-            )
+            response = self._request('PUT', f'/products/{product_id}.json', json=product_payload)
             
             if response.status_code == 200:
                 print(f"✅ Product {product_id} published successfully!")
@@ -171,7 +499,7 @@ class ShopifyIntegration:
 def test_shopify_connection():
     """Test the Shopify connection"""
     try:
-        shopify = ShopifyIntegration()
+        shopify = ShopifyIntegration.shared()
         products = shopify.get_products(limit=1)
         print(f"✅ Shopify connection successful! Found {len(products)} products.")
         return True
@@ -0,0 +1,103 @@
+"""
+Merch Maker Lite - Stage Cache
+==============================
+
+Remembers the output of each pipeline stage under a content hash of its
+inputs (prompt and model settings, image and template bytes, product
+payload, ...). When a stage's inputs are unchanged its stored output is
+reused, so retrying a failed publish doesn't pay for a new idea, image
+and render.
+
+Output files are recorded with their hashes; an entry whose files have
+been deleted or modified is treated as a miss.
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+from pathlib import Path
+
+DEFAULT_CACHE_DIR = os.getenv('MERCH_STAGE_CACHE_DIR', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '.cache', 'stages'))
+STAGES = ('generate', 'mockup', 'upload', 'publish')
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(path):
+    """sha256 of a file's contents, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_inputs(*parts):
+    """Content hash of stage inputs.
+
+    Paths contribute their file contents (a missing file hashes as
+    missing), bytes and strings their value, anything else its sorted JSON.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, Path):
+            value = file_digest(part) if part.is_file() else 'missing'
+            digest.update(f"file:{value}".encode('utf-8'))
+        elif isinstance(part, bytes):
+            digest.update(b"bytes:" + hashlib.sha256(part).digest())
+        elif isinstance(part, str):
+            digest.update(f"str:{part}".encode('utf-8'))
+        else:
+            digest.update(f"json:{json.dumps(part, sort_keys=True, default=str)}".encode('utf-8'))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class StageCache:
+    """On-disk stage outputs keyed by (stage, input hash)"""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, force=(), enabled=True):
+        self.cache_dir = cache_dir
+        self.force = set(STAGES if 'all' in force else force)
+        self.enabled = enabled
+
+    def _path(self, stage, key):
+        return os.path.join(self.cache_dir, stage, f"{key}.json")
+
+    def get(self, stage, key):
+        """Stored output for ``stage`` with input hash ``key``, or None"""
+        if not self.enabled or stage in self.force:
+            return None
+        try:
+            with open(self._path(stage, key), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        for path, digest in entry.get('files', {}).items():
+            if not os.path.isfile(path) or file_digest(path) != digest:
+                return None
+        print(f"♻️ {stage} inputs unchanged, reusing the previous output")
+        return entry['output']
+
+    def put(self, stage, key, output, files=()):
+        """Record ``output`` (JSON-serialisable) and the files it refers to"""
+        if not self.enabled:
+            return
+        entry = {
+            "stage": stage,
+            "output": output,
+            "files": {os.path.abspath(path): file_digest(path) for path in files},
+        }
+        path = self._path(stage, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # A unique temp file per writer: threads of one process store entries concurrently
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, default=str)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
@@ -0,0 +1,44 @@
+"""Near-duplicate detection against products seeded from the catalog mirror"""
+
+from catalog_mirror import CatalogMirror
+from dedup import DedupIndex, catalog_idea
+
+
+IDEA = {
+    "title": "Midnight Fox Explorer Tee",
+    "description": "A curious fox wanders a moonlit pine forest under a sky full of glowing stars",
+    "tags": ["fox", "forest", "night", "stars", "nature"],
+    "keywords": ["fox", "moonlit", "pine", "glowing"],
+}
+
+
+def _seeded_index(tmp_path, product):
+    mirror = CatalogMirror(':memory:')
+    mirror.upsert(product)
+    index = DedupIndex(str(tmp_path / 'dedup.sqlite3'))
+    for row in mirror.iter_all():
+        index.add(catalog_idea(row), item_id=f"shopify:{row['id']}")
+    return index
+
+
+def test_idea_already_in_catalog_is_rejected(tmp_path):
+    # As created by ShopifyIntegration.create_product and read back by a sync
+    index = _seeded_index(tmp_path, {
+        "id": 101, "title": IDEA["title"], "body_html": IDEA["description"],
+        "tags": "fox, forest, night, stars, nature", "status": "draft",
+    })
+
+    duplicate = index.add_if_unique(IDEA)
+
+    assert duplicate is not None and duplicate['id'] == 'shopify:101'
+    assert duplicate['similarity'] >= index.threshold
+
+
+def test_different_idea_is_accepted(tmp_path):
+    index = _seeded_index(tmp_path, {
+        "id": 102, "title": "Retro Synthwave Sunset Tee",
+        "body_html": "<p>Neon palm trees over a glowing grid at dusk</p>",
+        "tags": "retro, synthwave, sunset", "status": "draft",
+    })
+
+    assert index.add_if_unique(IDEA) is None
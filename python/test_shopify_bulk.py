@@ -0,0 +1,78 @@
+"""Bulk product creation against the local fake Shopify endpoint (fake_servers.py)"""
+
+import json
+
+import pytest
+
+from fake_servers import FakeShopifyServer, Latency
+from shopify_bulk import BulkProductCreator, load_items
+from shopify_integration import ShopifyIntegration
+
+
+def _product(n):
+    return {
+        "title": f"Test Tee {n}",
+        "description": "A test product",
+        "tags": ["test", "tee", "cotton", "graphic", "casual"],
+    }
+
+
+@pytest.fixture
+def shopify():
+    server = FakeShopifyServer(latency=Latency(0), bulk_delay=0)
+    server.start()
+    try:
+        yield server, ShopifyIntegration(base_url=server.api_url)
+    finally:
+        server.stop()
+
+
+def test_load_items_skips_failed_batch_rows(tmp_path):
+    path = tmp_path / 'products.jsonl'
+    rows = [
+        {"index": 0, "product": _product(0), "image_path": "a.png"},
+        {"index": 1, "error": "Connection error."},
+        {"index": 2, "product": None},
+        _product(3),
+    ]
+    path.write_text("\n".join(json.dumps(row) for row in rows) + "\n", encoding='utf-8')
+
+    assert [item['title'] for item in load_items(path)] == ["Test Tee 0", "Test Tee 3"]
+
+
+def test_local_images_are_staged(shopify, tmp_path):
+    server, client = shopify
+    image = tmp_path / 'product_00000.png'
+    image.write_bytes(b'\x89PNG fake image')
+    items = [{**_product(0), "image_path": str(image)}, {**_product(1), "image_path": str(tmp_path / 'missing.png')}]
+
+    staged = BulkProductCreator(client).stage_images(items)
+
+    assert 'image_urls' not in staged[1]
+    assert all('image_path' not in item for item in staged)
+    assert staged[0]['image_urls'][0].endswith('/product_00000.png')
+    assert image.read_bytes() in server.staged_files.values()
+
+
+@pytest.mark.parametrize('mode', ['batched', 'bulk'])
+def test_create_products(shopify, mode):
+    server, client = shopify
+    items = [_product(n) for n in range(5)]
+    creator = BulkProductCreator(client, batch_size=2, poll_interval=0.01, timeout=10)
+
+    results = creator.create_products(items, mode=mode)
+
+    assert [r['index'] for r in results] == list(range(5))
+    assert [r['product']['title'] for r in results] == [item['title'] for item in items]
+    assert sorted(p['title'] for p in server.products.values()) == sorted(item['title'] for item in items)
+
+
+def test_create_batched_maps_user_errors(shopify):
+    server, client = shopify
+    items = [_product(0), {**_product(1), "title": ""}]
+
+    results = BulkProductCreator(client).create_products(items, mode='batched')
+
+    assert results[0]['product'] is not None
+    assert results[1]['product'] is None and results[1]['errors']
+    assert len(server.products) == 1
@@ -0,0 +1,125 @@
+"""
+Merch Maker Lite - Streaming Upload Bodies
+==========================================
+
+Request bodies that are generated from files on disk while they are sent,
+so uploading a multi-MB mockup never holds the whole image (or its base64
+text) in memory.
+
+Bodies are re-iterable and report their exact length, which makes
+``requests`` send a normal Content-Length header and lets a retry replay
+the body from the start.
+"""
+
+import os
+import re
+import json
+import uuid
+import base64
+
+CHUNK_SIZE = 64 * 1024
+# Raw bytes per base64 chunk: a multiple of 3 so chunks encode independently
+B64_CHUNK_SIZE = 3 * CHUNK_SIZE
+
+
+class FilePart:
+    """Raw file bytes, read from disk in chunks"""
+
+    def __init__(self, path, chunk_size=CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+
+    def __len__(self):
+        return os.path.getsize(self.path)
+
+    def __iter__(self):
+        with open(self.path, 'rb') as f:
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+
+class Base64FilePart:
+    """Base64 text of a file, encoded chunk by chunk as it is sent"""
+
+    def __init__(self, path, chunk_size=B64_CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size - chunk_size % 3 or 3
+
+    def __len__(self):
+        return (os.path.getsize(self.path) + 2) // 3 * 4
+
+    def __iter__(self):
+        with open(self.path, 'rb') as f:
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    return
+                yield base64.b64encode(chunk)
+
+
+class StreamingBody:
+    """A request body assembled from bytes and file parts"""
+
+    def __init__(self, parts):
+        self.parts = parts
+
+    def __len__(self):
+        return sum(len(part) for part in self.parts)
+
+    def __iter__(self):
+        for part in self.parts:
+            if isinstance(part, bytes):
+                yield part
+            else:
+                yield from part
+
+
+def attachment_placeholder():
+    """A unique marker to put in a JSON payload where file data should go"""
+    return f"__attachment_{uuid.uuid4().hex}__"
+
+
+def json_body(payload, attachments):
+    """Serialise ``payload`` with each placeholder replaced by a file's base64.
+
+    ``attachments`` maps placeholder strings (see attachment_placeholder)
+    to file paths.
+    """
+    text = json.dumps(payload)
+    if not attachments:
+        return StreamingBody([text.encode('utf-8')])
+    pattern = re.compile('|'.join(re.escape(placeholder) for placeholder in attachments))
+    parts = []
+    position = 0
+    for match in pattern.finditer(text):
+        parts.append(text[position:match.start()].encode('utf-8'))
+        parts.append(Base64FilePart(attachments[match.group(0)]))
+        position = match.end()
+    parts.append(text[position:].encode('utf-8'))
+    return StreamingBody(parts)
+
+
+def multipart_body(fields, file_field, path, filename=None, content_type='application/octet-stream'):
+    """Build a multipart/form-data body that streams ``path`` as its last part.
+
+    Returns (body, content_type_header).
+    """
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields:
+        parts.append((
+            f'--{boundary}\r\n'
+            f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+            f'{value}\r\n'
+        ).encode('utf-8'))
+    parts.append((
+        f'--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="{file_field}"; filename="{filename or os.path.basename(path)}"\r\n'
+        f'Content-Type: {content_type}\r\n\r\n'
+    ).encode('utf-8'))
+    parts.append(FilePart(path))
+    parts.append(f'\r\n--{boundary}--\r\n'.encode('utf-8'))
+    return StreamingBody(parts), f'multipart/form-data; boundary={boundary}'